@@ -0,0 +1,185 @@
+# bench.py
+"""
+Seeded benchmark scenarios for the simulation and rendering hot paths.
+
+Each scenario builds a world from a fixed seed, runs the headless Match for
+a number of ticks and times every hot path separately (inclusive times, so
+astar_path also counts inside the bot AI it is called from). Results are
+ms-per-tick percentiles, saved as JSON so runs can be compared.
+
+    python bench.py                                  # every scenario
+    python bench.py --scenario bots_100 --ticks 300
+    python bench.py --out new.json --compare old.json
+"""
+
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse, json, math, platform, random, time
+import pygame
+import game
+
+SCENARIOS = {
+    "bots_10":      dict(bots=10),
+    "bots_100":     dict(bots=100),
+    "bots_500":     dict(bots=500),
+    "bullet_storm": dict(bots=50, bullets=800),
+    "large_maze":   dict(bots=100, cols=200, rows=150),
+    "chunked_world": dict(bots=100, cols=1000, rows=1000, chunk=32),
+}
+
+# build_world changes game.COLS/ROWS, so scenarios without a size use the defaults from before any ran
+DEFAULT_SIZE = (game.COLS, game.ROWS)
+
+PHASES = ("tick", "astar_path", "line_of_sight", "ricochet", "wall_collision",
+          "bullet_update", "bullet_hits", "draw")
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * q
+    lo = math.floor(k); hi = math.ceil(k)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+class PhaseTimer:
+    """Accumulates wrapped-call time per phase and closes it off per tick."""
+    def __init__(self):
+        self.current = {}
+        self.calls = {}
+        self.samples = {name: [] for name in PHASES}
+
+    def wrap(self, name, fn):
+        def timed(*args, **kwargs):
+            t = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.current[name] = self.current.get(name, 0.0) + time.perf_counter() - t
+                self.calls[name] = self.calls.get(name, 0) + 1
+        return timed
+
+    def end_tick(self):
+        for name in PHASES:
+            self.samples[name].append(self.current.get(name, 0.0) * 1000)
+        self.current = {}
+
+    def report(self, ticks):
+        out = {}
+        for name, values in self.samples.items():
+            out[name] = {
+                "mean": sum(values) / len(values) if values else 0.0,
+                "p50": percentile(values, 0.50),
+                "p90": percentile(values, 0.90),
+                "p99": percentile(values, 0.99),
+                "max": max(values, default=0.0),
+                "calls_per_tick": self.calls.get(name, 0) / ticks if ticks else 0.0,
+            }
+        return out
+
+def storm(match, count, rng):
+    """Top the bullet count back up to count with random shots."""
+    shooters = [b for b in match.bots if b.alive] or [match.player]
+    while len(match.bullets) < count:
+        s = rng.choice(shooters)
+        owner = "player" if rng.random() < 0.5 else s
+        match.bullets.append(game.Bullet(s.x, s.y, rng.uniform(0, game.WORLD_W), rng.uniform(0, game.WORLD_H), owner))
+
+def run_scenario(name, ticks, seed, screen, font):
+    cfg = SCENARIOS[name]
+    game.build_world(seed, cfg.get("cols", DEFAULT_SIZE[0]), cfg.get("rows", DEFAULT_SIZE[1]), cfg.get("chunk", 0))
+    match = game.Match(bot_count=cfg["bots"])
+    pilot = game.Autopilot()
+    rng = random.Random(seed)
+    timer = PhaseTimer()
+    dt = 1 / game.FPS
+
+    originals = {n: getattr(game, n) for n in ("astar_path", "line_of_sight", "choose_wall_point_for_ricochet")}
+    game.astar_path = timer.wrap("astar_path", originals["astar_path"])
+    game.line_of_sight = timer.wrap("line_of_sight", originals["line_of_sight"])
+    game.choose_wall_point_for_ricochet = timer.wrap("ricochet", originals["choose_wall_point_for_ricochet"])
+    game.wall_index.collides = timer.wrap("wall_collision", game.wall_index.collides)
+    match.bullets.update = timer.wrap("bullet_update", match.bullets.update)
+    match.bullets.resolve_hits = timer.wrap("bullet_hits", match.bullets.resolve_hits)
+    try:
+        for _ in range(ticks):
+            if cfg.get("bullets"):
+                storm(match, cfg["bullets"], rng)
+            move = pilot.control(match, dt)
+            t = time.perf_counter()
+            match.step(dt, move)
+            timer.current["tick"] = time.perf_counter() - t
+            # keep the scenario load constant: nobody stays dead
+            match.player.alive = True
+            match.player.health = game.PLAYER_MAX_HEALTH
+            for b in match.bots:
+                if not b.alive:
+                    b.alive = True
+                    b.health = game.BOT_MAX_HEALTH
+            t = time.perf_counter()
+            game.draw_frame(screen, font, match)
+            timer.current["draw"] = time.perf_counter() - t
+            timer.end_tick()
+    finally:
+        for n, fn in originals.items():
+            setattr(game, n, fn)
+    return {"config": cfg, "ticks": ticks, "seed": seed, "phases": timer.report(ticks)}
+
+def compare(results, baseline, threshold=0.10):
+    print(f"\n{'scenario':<14}{'phase':<16}{'base p50':>10}{'new p50':>10}{'change':>9}")
+    for name, res in results["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        for phase, stats in res["phases"].items():
+            before = old["phases"].get(phase, {}).get("p50", 0.0)
+            after = stats["p50"]
+            if before <= 0.001 and after <= 0.001:
+                continue
+            change = (after - before) / before if before else math.inf
+            flag = "  REGRESSION" if change > threshold else ""
+            print(f"{name:<14}{phase:<16}{before:>10.3f}{after:>10.3f}{change:>+9.0%}{flag}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maze Battle Royale benchmarks")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="run only this scenario (repeatable)")
+    parser.add_argument("--ticks", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", default="bench_output.json")
+    parser.add_argument("--compare", help="earlier bench JSON to diff p50s against")
+    args = parser.parse_args(argv)
+
+    pygame.init()
+    screen = pygame.display.set_mode((game.WIDTH, game.HEIGHT))
+    font = game.get_font("Consolas", 18)
+
+    results = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "numpy": game.np.__version__ if game.np is not None else None,
+            "machine": platform.machine(),
+        },
+        "scenarios": {},
+    }
+    for name in args.scenario or SCENARIOS:
+        res = run_scenario(name, args.ticks, args.seed, screen, font)
+        results["scenarios"][name] = res
+        print(f"\n{name} ({args.ticks} ticks)")
+        print(f"  {'phase':<16}{'p50':>8}{'p90':>8}{'p99':>8}{'max':>8}{'calls':>8}")
+        for phase, st in res["phases"].items():
+            print(f"  {phase:<16}{st['p50']:>8.3f}{st['p90']:>8.3f}{st['p99']:>8.3f}{st['max']:>8.3f}{st['calls_per_tick']:>8.1f}")
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=1)
+    print(f"\nwrote {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
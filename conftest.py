@@ -0,0 +1,2 @@
+# conftest.py
+"""Lets pytest import the game modules (protocol, game, ...) from the repository root."""
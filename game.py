@@ -8,11 +8,18 @@ Maze Battle Royale v3
 - Bullets bounce off walls with energy loss
 - Camera follows player
 - 10 bots by default
+- Headless simulation: python game.py --headless --seed 1 --matches 100
 """
 
 import pygame, random, math, sys, time 
-from network_client import NetworkClient
+import argparse, json, collections, heapq, itertools, weakref
 import uuid
+from profiler import FrameProfiler
+from protocol import input_dt
+try:
+    import numpy as np
+except ImportError:  # bullets fall back to per-object updates
+    np = None
 
 # ---------- Config ----------
 WIDTH, HEIGHT = 1700, 1000
@@ -23,10 +30,18 @@ CELL_SIZE = 40
 COLS = 50
 ROWS = 36
 
-# Player / Bot settings
-PLAYER_SPEED = 2.6
-BOT_SPEED = 1.9
-BULLET_SPEED = 14
+# Simulation runs at a fixed tick; rendering interpolates between ticks
+SIM_RATE = 60
+SIM_DT = 1 / SIM_RATE
+MAX_FRAME_TIME = 0.25        # s of wall time a frame may feed the accumulator
+MAX_SIM_STEPS = 5            # ticks per rendered frame before the backlog is dropped
+
+# Player / Bot settings (speeds in px per second)
+PLAYER_SPEED = 156
+BOT_SPEED = 114
+BULLET_SPEED = 840
+BULLET_MIN_SPEED = 180       # a bounce leaving a bullet slower than this kills it
+BOUNCE_SKIN = 0.01           # px a bounce sets the bullet off the wall, so it starts clear of it
 BOT_COUNT = 10
 PLAYER_MAX_HEALTH = 100
 BOT_MAX_HEALTH = 75
@@ -50,57 +65,71 @@ WORLD_H = ROWS * CELL_SIZE
 SCALE_X = MINIMAP_WIDTH / WORLD_W
 SCALE_Y = MINIMAP_HEIGHT / WORLD_H
 
+# Profiling (F3 overlay, F4 dump Chrome trace)
+profiler = FrameProfiler()
 
-# ---------- Init ----------
-pygame.init()
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Fight Easy Royale v3")
-clock = pygame.time.Clock()
-font = pygame.font.SysFont("Consolas", 18)
- # music
-pygame.mixer.init()
-pygame.mixer.music.load("music.mp3") 
-pygame.mixer.music.play(-1) 
-pygame.mixer.music.set_volume(0.2)  
 
 def dist(a,b): return math.hypot(a[0]-b[0], a[1]-b[1])
 def clamp(v,a,b): return max(a,min(b,v))
-# min map helper
-def draw_full_map(screen, rooms, cell_size, minimap_width, minimap_height, pos=(WIDTH-210, 10)):
-    minimap_surf = pygame.Surface((minimap_width, minimap_height))
-    minimap_surf.set_alpha(220)
-    minimap_surf.fill((10, 10, 30))
+# ---------- Maze grid ----------
+# Directions used everywhere: 0 up, 1 right, 2 down, 3 left. A cell stores
+# a wall on side d as bit (1 << d).
+DIR_DX = (0, 1, 0, -1)
+DIR_DY = (-1, 0, 1, 0)
+
+class MazeGrid:
+    """Flat bytearray of wall bitmasks, indexed cells[y * cols + x].
+
+    build_adjacency() derives open[i] (bit d set when cell i can step in
+    direction d: no wall on either side and inside the grid) and adj[i]
+    (flat indices of those neighbours). Pathfinding, LOS and wall-rect
+    construction read these tables instead of recomputing them.
+    """
+    def __init__(self, cols, rows, cells=None):
+        self.cols = cols
+        self.rows = rows
+        self.cells = cells if cells is not None else bytearray(cols * rows)
+        self.open = bytearray(cols * rows)
+        self.adj = [()] * (cols * rows)
+
+    def has_wall(self, x, y, d):
+        return self.cells[y * self.cols + x] >> d & 1
+
+    def add_wall(self, x, y, d):
+        self.cells[y * self.cols + x] |= 1 << d
+
+    def clear(self, x, y):
+        self.cells[y * self.cols + x] = 0
+
+    def build_adjacency(self):
+        cols, rows, cells = self.cols, self.rows, self.cells
+        for y in range(rows):
+            for x in range(cols):
+                i = y * cols + x
+                mask = 0
+                nbs = []
+                for d in range(4):
+                    nx, ny = x + DIR_DX[d], y + DIR_DY[d]
+                    if not (0 <= nx < cols and 0 <= ny < rows):
+                        continue
+                    j = ny * cols + nx
+                    if cells[i] >> d & 1 or cells[j] >> ((d + 2) % 4) & 1:
+                        continue
+                    mask |= 1 << d
+                    nbs.append(j)
+                self.open[i] = mask
+                self.adj[i] = tuple(nbs)
+
+    def blocked(self, x, y, d):
+        """Wall between cell (x, y) and its neighbour in direction d."""
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            return not self.open[y * self.cols + x] >> d & 1
+        nx, ny = x + DIR_DX[d], y + DIR_DY[d]
+        return 0 <= nx < self.cols and 0 <= ny < self.rows and self.has_wall(nx, ny, (d + 2) % 4)
 
-    if not rooms:
-        return
-
-    min_x = min(rx for (rx, ry, rw, rh) in rooms)
-    min_y = min(ry for (rx, ry, rw, rh) in rooms)
-    max_x = max(rx + rw for (rx, ry, rw, rh) in rooms)
-    max_y = max(ry + rh for (rx, ry, rw, rh) in rooms)
-
-    world_w = (max_x - min_x) * cell_size
-    world_h = (max_y - min_y) * cell_size
-
-    scale_x = minimap_width / world_w
-    scale_y = minimap_height / world_h
-
-    font_small = pygame.font.SysFont("Consolas", 12)
-
-    for idx, (rx, ry, rw, rh) in enumerate(rooms):
-        rx_px = (rx - min_x) * cell_size * scale_x
-        ry_px = (ry - min_y) * cell_size * scale_y
-        rw_px = rw * cell_size * scale_x
-        rh_px = rh * cell_size * scale_y
-        pygame.draw.rect(minimap_surf, (180, 180, 220), (rx_px, ry_px, rw_px, rh_px), 0)
-        minimap_surf.blit(font_small.render(f"R{idx+1}", True, (255, 255, 255)), (rx_px + 2, ry_px + 2))
-
-    screen.blit(minimap_surf, pos)
-
-# ---------- Maze generation (DFS) + add random internal walls ----------
 # ---------- New "Room-based Maze" ----------
 def make_maze(cols, rows):
-    maze = [[[False, False, False, False] for _ in range(rows)] for _ in range(cols)]
+    maze = MazeGrid(cols, rows)
 # ---------- desgin romms ----------
     rooms = [
         (2, 2, 6, 5),    
@@ -126,52 +155,642 @@ def make_maze(cols, rows):
 
         rooms.append((rx, ry, rw, rh))
 
-    for rx, ry, rw, rh in rooms:
-        for x in range(rx, rx + rw):
-            for y in range(ry, ry + rh):
-                if x == rx: maze[x][y][3] = True  # left wall
-                if x == rx + rw - 1: maze[x][y][1] = True  # right wall
-                if y == ry: maze[x][y][0] = True  # top wall
-                if y == ry + rh - 1: maze[x][y][2] = True  # bottom wall
+    for room in rooms:
+        wall_room(maze, *room)
 
     for i in range(len(rooms) - 1):
         x1, y1, w1, h1 = rooms[i]
         x2, y2, w2, h2 = rooms[i + 1]
-        cx1, cy1 = x1 + w1 // 2, y1 + h1 // 2
-        cx2, cy2 = x2 + w2 // 2, y2 + h2 // 2
-        for x in range(min(cx1, cx2), max(cx1, cx2) + 1):
-            maze[x][cy1] = [False, False, False, False]
-        for y in range(min(cy1, cy2), max(cy1, cy2) + 1):
-            maze[cx2][y] = [False, False, False, False]
+        carve_corridor(maze, x1 + w1 // 2, y1 + h1 // 2, x2 + w2 // 2, y2 + h2 // 2)
 
+    maze.build_adjacency()
     return maze , rooms
 
-maze, rooms = make_maze(COLS, ROWS)
-
-
-wall_rects = []
-for x in range(COLS):
-    for y in range(ROWS):
-        wx = x*CELL_SIZE; wy = y*CELL_SIZE
-        walls = maze[x][y]
-        if walls[0]:
-            wall_rects.append(pygame.Rect(wx, wy, CELL_SIZE, 3))
-        if walls[1]:
-            wall_rects.append(pygame.Rect(wx+CELL_SIZE-3, wy, 3, CELL_SIZE))
-        if walls[2]:
-            wall_rects.append(pygame.Rect(wx, wy+CELL_SIZE-3, CELL_SIZE, 3))
-        if walls[3]:
-            wall_rects.append(pygame.Rect(wx, wy, 3, CELL_SIZE))
-
-WORLD_W = COLS * CELL_SIZE
-WORLD_H = ROWS * CELL_SIZE
-
-SCALE_X = MINIMAP_WIDTH / WORLD_W
-SCALE_Y = MINIMAP_HEIGHT / WORLD_H
-
+def wall_room(maze, rx, ry, rw, rh):
+    for x in range(rx, rx + rw):
+        for y in range(ry, ry + rh):
+            if x == rx: maze.add_wall(x, y, 3)  # left wall
+            if x == rx + rw - 1: maze.add_wall(x, y, 1)  # right wall
+            if y == ry: maze.add_wall(x, y, 0)  # top wall
+            if y == ry + rh - 1: maze.add_wall(x, y, 2)  # bottom wall
+
+def carve_corridor(maze, x1, y1, x2, y2):
+    """Clear an L-shaped corridor: along row y1 to column x2, then along it to y2."""
+    for x in range(min(x1, x2), max(x1, x2) + 1):
+        maze.clear(x, y1)
+    for y in range(min(y1, y2), max(y1, y2) + 1):
+        maze.clear(x2, y)
+
+WALL_THICKNESS = 3
+
+def build_wall_rects(maze):
+    """Wall geometry of the maze: (rects, cells).
+
+    Every wall flag is a WALL_THICKNESS strip along its cell edge. Strips on
+    the same line that touch or overlap are merged into one rect (which also
+    drops duplicates), then rects with the same span that lie side by side
+    (the two faces of a wall between neighbouring cells) are merged too. The
+    rects cover exactly the pixels the separate strips did. cells[i] holds
+    the flat indices of the maze cells whose wall flags rect i came from.
+    """
+    cs, t = CELL_SIZE, WALL_THICKNESS
+    horiz = []
+    vert = []
+    for y in range(maze.rows):
+        for x in range(maze.cols):
+            i = y*maze.cols + x
+            wx = x*cs; wy = y*cs
+            walls = maze.cells[i]
+            if walls & 1:
+                horiz.append((wx, wy, wx+cs, wy+t, {i}))
+            if walls & 2:
+                vert.append((wx+cs-t, wy, wx+cs, wy+cs, {i}))
+            if walls & 4:
+                horiz.append((wx, wy+cs-t, wx+cs, wy+cs, {i}))
+            if walls & 8:
+                vert.append((wx, wy, wx+t, wy+cs, {i}))
+    merged = _merge_runs(_merge_runs(horiz, 0), 1) + _merge_runs(_merge_runs(vert, 1), 0)
+    rects = [pygame.Rect(l, t, r - l, b - t) for l, t, r, b, _ in merged]
+    return rects, [tuple(sorted(c)) for *_, c in merged]
+
+def _merge_runs(boxes, axis):
+    """Merge (left, top, right, bottom, cells) boxes with the same extent
+    across axis (0: x, 1: y) that touch or overlap along it."""
+    lo, hi = (0, 2) if axis == 0 else (1, 3)
+    lines = {}
+    for b in boxes:
+        lines.setdefault((b[1], b[3]) if axis == 0 else (b[0], b[2]), []).append(b)
+    out = []
+    for line in lines.values():
+        line.sort(key=lambda b: b[lo])
+        cur = None
+        for b in line:
+            if cur is not None and b[lo] <= cur[hi]:
+                cur[hi] = max(cur[hi], b[hi])
+                cur[4] |= b[4]
+                continue
+            if cur is not None:
+                out.append(tuple(cur))
+            cur = [b[0], b[1], b[2], b[3], set(b[4])]
+        out.append(tuple(cur))
+    return out
+
+# ---------- Wall spatial index ----------
+class WallIndex:
+    """Static uniform grid over the wall rects, one bucket per maze cell.
+
+    Built once after make_maze; collision queries only look at the buckets
+    the query rect overlaps instead of scanning every wall.
+    """
+    def __init__(self, rects, cell_size, cols, rows):
+        self.rects = rects
+        self.cell_size = cell_size
+        self.cols = cols
+        self.rows = rows
+        self.buckets = [[] for _ in range(cols * rows)]
+        self._arrays = None
+        for wr in rects:
+            for i in self.cells(wr):
+                self.buckets[i].append(wr)
+
+    def cells(self, r):
+        cs = self.cell_size
+        x0 = max(0, r.left // cs); x1 = min(self.cols - 1, (r.right - 1) // cs)
+        y0 = max(0, r.top // cs); y1 = min(self.rows - 1, (r.bottom - 1) // cs)
+        for gy in range(y0, y1 + 1):
+            row = gy * self.cols
+            for gx in range(x0, x1 + 1):
+                yield row + gx
+
+    def first_hit(self, r):
+        """First wall overlapping rect r, or None."""
+        buckets = self.buckets
+        for i in self.cells(r):
+            bucket = buckets[i]
+            if bucket:
+                j = r.collidelist(bucket)
+                if j != -1:
+                    return bucket[j]
+        return None
+
+    def collides(self, r):
+        return self.first_hit(r) is not None
+
+    def arrays(self):
+        """NumPy view of the index: (walls, table).
+
+        walls is a (W+1, 4) float array of left, top, right, bottom and table
+        a (cells, K) int array of wall ids per cell, padded with -1.
+        """
+        if self._arrays is None:
+            ids = {id(wr): i for i, wr in enumerate(self.rects)}
+            # trailing sentinel row (never overlaps anything) is what -1 padding indexes
+            walls = np.array([(wr.left, wr.top, wr.right, wr.bottom) for wr in self.rects]
+                             + [(math.inf, math.inf, -math.inf, -math.inf)], float)
+            k = max(1, max(len(b) for b in self.buckets))
+            table = np.full((len(self.buckets), k), -1, np.int32)
+            for i, bucket in enumerate(self.buckets):
+                table[i, :len(bucket)] = [ids[id(wr)] for wr in bucket]
+            self._arrays = (walls, table)
+        return self._arrays
+
+    def query(self, r):
+        """All walls overlapping rect r (each wall once)."""
+        found = []
+        seen = set()
+        buckets = self.buckets
+        for i in self.cells(r):
+            for wr in buckets[i]:
+                if id(wr) not in seen and r.colliderect(wr):
+                    seen.add(id(wr))
+                    found.append(wr)
+        return found
+
+# ---------- Entity spatial hash ----------
+ENTITY_CELL = CELL_SIZE * 2  # bucket size of EntityGrid, in px
+HIT_QUERY_RADIUS = 20        # px around a bullet that can hold a bot it touches (half a bot plus a bullet)
+
+class EntityGrid:
+    """Dynamic spatial hash over entity centres.
+
+    Buckets are keyed by (cx, cy), so the grid has no fixed extent and works
+    for chunked worlds too. Entities that move are re-bucketed by sync (or
+    move) only when they cross into another bucket; dead ones drop out.
+    Queries see positions as of the last sync.
+    """
+    def __init__(self, cell_size=ENTITY_CELL):
+        self.cell_size = cell_size
+        self.buckets = {}            # (cx, cy) -> entities
+        self.where = {}              # entity -> its key
+
+    def __len__(self):
+        return len(self.where)
+
+    def __contains__(self, e):
+        return e in self.where
+
+    def key(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def insert(self, e):
+        k = self.where[e] = self.key(e.x, e.y)
+        self.buckets.setdefault(k, []).append(e)
+
+    def remove(self, e):
+        k = self.where.pop(e, None)
+        if k is None:
+            return
+        bucket = self.buckets[k]
+        bucket.remove(e)
+        if not bucket:
+            del self.buckets[k]
+
+    def move(self, e):
+        """Re-bucket e after it moved (inserting it if it is new)."""
+        k = self.key(e.x, e.y)
+        old = self.where.get(e)
+        if old == k:
+            return
+        if old is not None:
+            self.remove(e)
+        self.where[e] = k
+        self.buckets.setdefault(k, []).append(e)
+
+    def sync(self, entities):
+        """Bring every entity in entities up to date: live ones moved, dead ones removed."""
+        for e in entities:
+            if getattr(e, 'alive', True):
+                self.move(e)
+            elif e in self.where:
+                self.remove(e)
+
+    def query(self, x, y, radius, exclude=None):
+        """Entities whose centre lies within radius of (x, y)."""
+        cs, buckets = self.cell_size, self.buckets
+        x0 = int((x - radius) // cs); x1 = int((x + radius) // cs)
+        y0 = int((y - radius) // cs); y1 = int((y + radius) // cs)
+        r2 = radius * radius
+        found = []
+        for cy in range(y0, y1 + 1):
+            for cx in range(x0, x1 + 1):
+                for e in buckets.get((cx, cy), ()):
+                    if e is not exclude and (e.x - x) ** 2 + (e.y - y) ** 2 <= r2:
+                        found.append(e)
+        return found
+
+    def nearest(self, x, y, k=1, exclude=None, where=None):
+        """Up to k (distance, entity) pairs closest to (x, y), nearest first.
+
+        Searches rings of buckets outward from (x, y) and stops once nothing
+        outside the rings can beat the k-th best; when the rings would cover
+        more buckets than there are entities, the rest is a plain scan.
+        where, if given, filters the candidates.
+        """
+        cs, buckets = self.cell_size, self.buckets
+        total = len(self.where) - (exclude in self.where)
+        cx, cy = self.key(x, y)
+        best = []
+        seen = 0
+        ring = 0
+        while seen < total:
+            if ring == 0:
+                cells = [(cx, cy)]
+            else:
+                cells = [(gx, cy - ring) for gx in range(cx - ring, cx + ring + 1)]
+                cells += [(gx, cy + ring) for gx in range(cx - ring, cx + ring + 1)]
+                cells += [(cx - ring, gy) for gy in range(cy - ring + 1, cy + ring)]
+                cells += [(cx + ring, gy) for gy in range(cy - ring + 1, cy + ring)]
+            for key in cells:
+                for e in buckets.get(key, ()):
+                    if e is exclude:
+                        continue
+                    seen += 1
+                    if where is None or where(e):
+                        best.append((math.hypot(e.x - x, e.y - y), e))
+            if len(best) >= k:
+                best.sort(key=lambda de: de[0])
+                del best[k:]
+                # distance from (x, y) to the edge of the searched square
+                edge = min(x - (cx - ring) * cs, (cx + ring + 1) * cs - x,
+                           y - (cy - ring) * cs, (cy + ring + 1) * cs - y)
+                if best[-1][0] <= edge:
+                    return best
+            ring += 1
+            if (2 * ring + 1) ** 2 > 4 * total:
+                searched = ring - 1
+                for (gx, gy), bucket in buckets.items():
+                    if max(abs(gx - cx), abs(gy - cy)) <= searched:
+                        continue
+                    for e in bucket:
+                        if e is not exclude and (where is None or where(e)):
+                            best.append((math.hypot(e.x - x, e.y - y), e))
+                break
+        best.sort(key=lambda de: de[0])
+        return best[:k]
+
+
+# ---------- Chunked world ----------
+CHUNK_CELLS = 32             # chunk side in cells
+CHUNK_ROOMS = 5              # rooms generated per chunk
+CHUNK_CACHE_SIZE = 256       # resident chunks before the least recently used unpinned ones go
+CHUNK_KEEP_RADIUS = 1        # chunks around every player and live bot kept resident
+CHUNK_KEEP_EVERY = 10        # ticks between keep_near refreshes
+
+def chunk_rng(seed, *key):
+    """Random stream for one piece of a chunked world, from the world seed alone."""
+    return random.Random(":".join(map(str, (seed,) + key)))
+
+class Chunk:
+    """One square of a ChunkedMaze, generated from (seed, cx, cy) only.
+
+    Rooms and corridors are laid out like make_maze, inside a one-cell
+    margin, so chunk border cells never have walls and stepping into the
+    next chunk is always open. Each border shared with a neighbour also has
+    a door cell drawn from the seed and that border, which both chunks carve
+    a corridor from, so rooms connect across chunks the same way from either
+    side. cells and open are the local MazeGrid tables (open including the
+    steps into neighbouring chunks); rects, wall_cells and buckets are this
+    chunk's wall geometry, in world coordinates and flat world cell indices.
+    """
+    def __init__(self, world, cx, cy):
+        size, cols = world.size, world.cols
+        self.x0, self.y0 = x0, y0 = cx * size, cy * size
+        self.w = w = min(size, cols - x0)
+        self.h = h = min(size, world.rows - y0)
+        rng = chunk_rng(world.seed, cx, cy)
+        grid = MazeGrid(w, h)
+        rooms = []
+        if w >= 8 and h >= 8:
+            for _ in range(CHUNK_ROOMS):
+                rw = rng.randint(4, min(8, w - 2))
+                rh = rng.randint(4, min(8, h - 2))
+                rooms.append((rng.randint(1, w - rw - 1), rng.randint(1, h - rh - 1), rw, rh))
+        for room in rooms:
+            wall_room(grid, *room)
+        centers = [(rx + rw // 2, ry + rh // 2) for rx, ry, rw, rh in rooms]
+        for (x1, y1), (x2, y2) in zip(centers, centers[1:]):
+            carve_corridor(grid, x1, y1, x2, y2)
+        if centers:
+            for dx, dy in world.doors(cx, cy):
+                carve_corridor(grid, dx, dy, *centers[0])
+        self.cells = cells = grid.cells
+
+        # everything open but the world edge, then close both sides of every wall
+        # (walls only sit on inner cells, so their neighbours are in this chunk too)
+        self.open = open_ = bytearray([15]) * (w * h)
+        edges = ((0, y0 == 0, range(w)), (2, y0 + h == world.rows, range((h - 1) * w, h * w)),
+                 (3, x0 == 0, range(0, w * h, w)), (1, x0 + w == cols, range(w - 1, w * h, w)))
+        for d, at_edge, border in edges:
+            if at_edge:
+                for j in border:
+                    open_[j] &= ~(1 << d)
+        steps = (-w, 1, w, -1)
+        for j, walls in enumerate(cells):
+            if walls:
+                for d in range(4):
+                    if walls >> d & 1:
+                        open_[j] &= ~(1 << d)
+                        open_[j + steps[d]] &= ~(1 << (d + 2) % 4)
+
+        rects, cells = build_wall_rects(grid)
+        ox, oy = x0 * CELL_SIZE, y0 * CELL_SIZE
+        self.rects = [r.move(ox, oy) for r in rects]
+        self.wall_cells = [tuple((y0 + j // w) * cols + x0 + j % w for j in c) for c in cells]
+        self.buckets = [[] for _ in range(w * h)]
+        for r, wr in zip(rects, self.rects):
+            for gy in range(r.top // CELL_SIZE, (r.bottom - 1) // CELL_SIZE + 1):
+                for gx in range(r.left // CELL_SIZE, (r.right - 1) // CELL_SIZE + 1):
+                    self.buckets[gy * w + gx].append(wr)
+
+class ChunkTable:
+    """Read-only flat-index table computed by a function, like MazeGrid.cells/open/adj."""
+    def __init__(self, lookup, size):
+        self.lookup = lookup
+        self.size = size
+
+    def __getitem__(self, i):
+        return self.lookup(i)
+
+    def __len__(self):
+        return self.size
+
+class ChunkedMaze:
+    """MazeGrid stand-in for worlds too large to generate up front.
+
+    The world is cut into size x size chunks, generated on first touch and
+    identical every time they are regenerated. cells, open and adj answer
+    the same flat-index lookups as MazeGrid's tables, so pathfinding, LOS and
+    movement need no changes. keep_near() materializes the chunks around an
+    owner's entities, pins them and marks them recently used; past cap
+    resident chunks, the least recently used unpinned ones are dropped.
+    """
+    def __init__(self, seed, cols, rows, size=CHUNK_CELLS, cap=CHUNK_CACHE_SIZE):
+        self.seed = seed
+        self.cols = cols
+        self.rows = rows
+        self.size = size
+        self.cap = cap
+        self.ccols = (cols + size - 1) // size
+        self.crows = (rows + size - 1) // size
+        self.chunks = collections.OrderedDict()
+        self.pins = weakref.WeakKeyDictionary()   # owner -> chunk keys it keeps resident
+        steps = (-cols, 1, cols, -1)
+        self.steps = [tuple(steps[d] for d in range(4) if m >> d & 1) for m in range(16)]
+
+    # made on access rather than stored: a stored table would hold a bound
+    # method of the maze, and the cycle would keep a dropped world alive
+    # until a full garbage collection
+    @property
+    def cells(self):
+        return ChunkTable(self.cell_walls, self.cols * self.rows)
+
+    @property
+    def open(self):
+        return ChunkTable(self.open_mask, self.cols * self.rows)
+
+    @property
+    def adj(self):
+        return ChunkTable(self.neighbours, self.cols * self.rows)
+
+    def doors(self, cx, cy):
+        """Local door cells on the borders chunk (cx, cy) shares with its neighbours."""
+        size = self.size
+        w = min(size, self.cols - cx * size)
+        h = min(size, self.rows - cy * size)
+        out = []
+        if cx > 0:
+            out.append((0, chunk_rng(self.seed, "v", cx - 1, cy).randrange(h)))
+        if cx < self.ccols - 1:
+            out.append((w - 1, chunk_rng(self.seed, "v", cx, cy).randrange(h)))
+        if cy > 0:
+            out.append((chunk_rng(self.seed, "h", cx, cy - 1).randrange(w), 0))
+        if cy < self.crows - 1:
+            out.append((chunk_rng(self.seed, "h", cx, cy).randrange(w), h - 1))
+        return out
+
+    def chunk(self, cx, cy):
+        c = self.chunks.get((cx, cy))
+        if c is None:
+            profiler.count("chunk_generate")
+            c = self.chunks[(cx, cy)] = Chunk(self, cx, cy)
+            self.evict()
+        return c
+
+    def locate(self, i):
+        """(chunk, local index) of flat world cell i."""
+        y, x = divmod(i, self.cols)
+        size = self.size
+        c = self.chunks.get((x // size, y // size)) or self.chunk(x // size, y // size)
+        return c, (y - c.y0) * c.w + x - c.x0
+
+    def has_wall(self, x, y, d):
+        c, j = self.locate(y * self.cols + x)
+        return c.cells[j] >> d & 1
+
+    def cell_walls(self, i):
+        c, j = self.locate(i)
+        return c.cells[j]
+
+    def open_mask(self, i):
+        c, j = self.locate(i)
+        return c.open[j]
+
+    def neighbours(self, i):
+        c, j = self.locate(i)
+        return [i + step for step in self.steps[c.open[j]]]
+
+    def blocked(self, x, y, d):
+        """Wall between cell (x, y) and its neighbour in direction d."""
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            return not self.open_mask(y * self.cols + x) >> d & 1
+        nx, ny = x + DIR_DX[d], y + DIR_DY[d]
+        return 0 <= nx < self.cols and 0 <= ny < self.rows and self.has_wall(nx, ny, (d + 2) % 4)
+
+    def wall_bucket(self, i):
+        c, j = self.locate(i)
+        return c.buckets[j]
+
+    def keep_near(self, owner, points, radius=CHUNK_KEEP_RADIUS):
+        """Materialize and pin, for owner, the chunks within radius of world points."""
+        span = self.size * CELL_SIZE
+        keys = set()
+        for x, y in points:
+            cx, cy = int(x // span), int(y // span)
+            for ky in range(max(0, cy - radius), min(self.crows, cy + radius + 1)):
+                for kx in range(max(0, cx - radius), min(self.ccols, cx + radius + 1)):
+                    keys.add((kx, ky))
+        self.pins[owner] = keys
+        for key in keys:
+            self.chunk(*key)
+            self.chunks.move_to_end(key)
+        self.evict()
+
+    def evict(self):
+        if len(self.chunks) <= self.cap:
+            return
+        pinned = set().union(*self.pins.values())
+        for key in list(self.chunks):
+            if len(self.chunks) <= self.cap:
+                break
+            if key not in pinned:
+                del self.chunks[key]
+                profiler.count("chunk_evict")
+
+class ChunkedWallIndex(WallIndex):
+    """WallIndex over a ChunkedMaze: the same queries, with buckets fetched from the chunks.
+
+    There is no global wall table, so no arrays() (see BulletSystem.supports).
+    """
+    def __init__(self, maze, cell_size=CELL_SIZE):
+        self.maze = maze
+        self.rects = ()          # no global wall list; see the chunks
+        self.cell_size = cell_size
+        self.cols = maze.cols
+        self.rows = maze.rows
+        self.buckets = ChunkTable(maze.wall_bucket, maze.cols * maze.rows)
+
+# ---------- Static world layer ----------
+STATIC_TILE_CELLS = 25       # 1000 px tiles, about 4 MB each
+
+def static_tile_cache(tile_px):
+    """Tiles worth keeping: the most the viewport can touch plus one more column and row."""
+    return ((WIDTH - 1) // tile_px + 3) * ((HEIGHT - 1) // tile_px + 3)
+
+FLOOR_COLOR = (18, 18, 30)
+WALL_COLOR = (100, 100, 120)
+BACKGROUND_COLOR = (12, 12, 25)
+
+class StaticLayer:
+    """Floor and walls rendered once into cached world-space tiles.
+
+    Tiles are rendered lazily the first time the camera sees them; each frame
+    only blits the few tiles under the viewport. At most cache_size tiles are
+    kept (by default sized from the viewport, see static_tile_cache), least
+    recently seen dropped first, so memory follows the screen and not the
+    world. Call invalidate() when the maze changes.
+    """
+    def __init__(self, index, tile_cells=STATIC_TILE_CELLS, cache_size=None):
+        self.index = index
+        self.tile_px = tile_cells * index.cell_size
+        self.world_w = index.cols * index.cell_size
+        self.world_h = index.rows * index.cell_size
+        self.cache_size = cache_size or static_tile_cache(self.tile_px)
+        self.tiles = collections.OrderedDict()
+
+    def invalidate(self):
+        self.tiles.clear()
+
+    def tile(self, tx, ty):
+        surf = self.tiles.get((tx, ty))
+        if surf is None:
+            surf = self.tiles[(tx, ty)] = self.render_tile(tx, ty)
+            if len(self.tiles) > self.cache_size:
+                self.tiles.popitem(last=False)
+        else:
+            self.tiles.move_to_end((tx, ty))
+        return surf
+
+    def render_tile(self, tx, ty):
+        cs = self.index.cell_size
+        ox, oy = tx * self.tile_px, ty * self.tile_px
+        w = min(self.tile_px, self.world_w - ox)
+        h = min(self.tile_px, self.world_h - oy)
+        surf = pygame.Surface((w, h))
+        if pygame.display.get_surface():
+            surf = surf.convert()
+        surf.fill(BACKGROUND_COLOR)
+        for gx in range(ox // cs, (ox + w + cs - 1) // cs):
+            for gy in range(oy // cs, (oy + h + cs - 1) // cs):
+                pygame.draw.rect(surf, FLOOR_COLOR, (gx*cs - ox, gy*cs - oy, cs-1, cs-1))
+        for wr in self.index.query(pygame.Rect(ox, oy, w, h)):
+            pygame.draw.rect(surf, WALL_COLOR, wr.move(-ox, -oy))
+        return surf
 
+    def draw(self, surf, camx, camy):
+        size = self.tile_px
+        left = camx - WIDTH/2; top = camy - HEIGHT/2
+        tx0 = max(0, int(left // size)); tx1 = min((self.world_w - 1) // size, int((left + WIDTH) // size))
+        ty0 = max(0, int(top // size)); ty1 = min((self.world_h - 1) // size, int((top + HEIGHT) // size))
+        batch = []
+        for ty in range(ty0, ty1 + 1):
+            for tx in range(tx0, tx1 + 1):
+                # floor, not int(): tile origins are often left of/above the screen
+                batch.append((self.tile(tx, ty), (math.floor(tx*size - left), math.floor(ty*size - top))))
+        surf.blits(batch, doreturn=False)
+
+# ---------- Minimap ----------
+MINIMAP_RATE = 10            # dot layer refreshes per second
+MINIMAP_ALPHA = 180
+
+class Minimap:
+    """Minimap in two persistent layers.
+
+    The static layer (rooms, labels, walls) is rendered once per world. The
+    dot layer (static layer plus bot and pickup dots) is recomposed at most
+    rate times a second; the player's own marker is blitted on top every
+    frame so it never lags. That makes two blits per frame.
+    """
+    def __init__(self, rooms, walls, world_w, world_h, size=(MINIMAP_WIDTH, MINIMAP_HEIGHT), rate=MINIMAP_RATE):
+        self.rooms = rooms
+        self.walls = walls
+        self.size = size
+        self.sx = size[0] / world_w
+        self.sy = size[1] / world_h
+        self.interval = 1.0 / rate if rate else 0.0
+        self.static = None
+        self.dots = None
+        self.marker = None
+        self.next_refresh = 0.0
+
+    def render_static(self):
+        surf = pygame.Surface(self.size)
+        surf.fill((10,10,30))
+        sx, sy = self.sx, self.sy
+        font_small = get_font("Consolas", 12)
+        for idx, (rx, ry, rw, rh) in enumerate(self.rooms):
+            rx_px = rx * CELL_SIZE * sx
+            ry_px = ry * CELL_SIZE * sy
+            pygame.draw.rect(surf, (180,180,220), (rx_px, ry_px, rw * CELL_SIZE * sx, rh * CELL_SIZE * sy))
+            surf.blit(text_cache.render(font_small, f"R{idx+1}", (255,255,255)), (rx_px+2, ry_px+2))
+        for w in self.walls:
+            pygame.draw.rect(surf, (70,70,100), (int(w.x * sx), int(w.y * sy), max(1, round(w.w * sx)), max(1, round(w.h * sy))))
+        self.static = surf
+        self.dots = pygame.Surface(self.size)
+        self.dots.set_alpha(MINIMAP_ALPHA)
+        self.marker = pygame.Surface((9, 9), pygame.SRCALPHA)
+        pygame.draw.circle(self.marker, (50,180,255), (4, 4), 4)
+        self.marker.set_alpha(MINIMAP_ALPHA)
+
+    def refresh(self, match):
+        dots = self.dots
+        dots.blit(self.static, (0, 0))
+        sx, sy = self.sx, self.sy
+        for p in match.pickups:
+            dots.fill(p.color, (int(p.x * sx) - 1, int(p.y * sy) - 1, 2, 2))
+        for b in match.bots:
+            if b.alive:
+                pygame.draw.circle(dots, (240,100,100), (int(b.x * sx), int(b.y * sy)), 3)
+        profiler.count("minimap_refresh")
+
+    def draw(self, screen, match, pos, view=None, now=None):
+        if self.static is None:
+            self.render_static()
+        now = time.perf_counter() if now is None else now
+        if now >= self.next_refresh:
+            self.next_refresh = now + self.interval
+            self.refresh(match)
+        px, py = view or (match.player.x, match.player.y)
+        screen.blits([
+            (self.dots, pos),
+            (self.marker, (pos[0] + int(px * self.sx) - 4, pos[1] + int(py * self.sy) - 4)),
+        ], False)
 
 # ---------- Entities ----------
+# ids of bullets and pickups, one counter per kind so a long-lived pickup is
+# not overtaken by the bullet ids (the wire format keeps the low 14 bits)
+bullet_ids = itertools.count(1)
+pickup_ids = itertools.count(1)
+
 class Entity:
     def __init__(self, x, y, w, h, color):
         self.x = float(x)
@@ -182,6 +801,11 @@ class Entity:
 
         self.x = max(self.w / 2, min(WORLD_W - self.w / 2, self.x))
         self.y = max(self.h / 2, min(WORLD_H - self.h / 2, self.y))
+        self.prev_x, self.prev_y = self.x, self.y   # position at the start of the tick
+
+    def lerp_pos(self, alpha):
+        """Position alpha of the way through the current tick, for rendering."""
+        return self.prev_x + (self.x - self.prev_x) * alpha, self.prev_y + (self.y - self.prev_y) * alpha
 
 
 
@@ -197,34 +821,31 @@ class Player(Entity):
         super().__init__(x,y,28,28,(50,180,255))
         self.health=PLAYER_MAX_HEALTH; self.speed=PLAYER_SPEED; self.ammo=30; self.alive=True
     def update(self, keys, dt):
-        if not self.alive: return
-        self.x = max(self.w / 2, min(WORLD_W - self.w / 2, self.x))
-        self.y = max(self.h / 2, min(WORLD_H - self.h / 2, self.y))
-
         dx=dy=0
         if keys[pygame.K_a] or keys[pygame.K_LEFT]: dx-=1
         if keys[pygame.K_d] or keys[pygame.K_RIGHT]: dx+=1
         if keys[pygame.K_w] or keys[pygame.K_UP]: dy-=1
         if keys[pygame.K_s] or keys[pygame.K_DOWN]: dy+=1
+        self.move(dx, dy, dt)
+
+    def move(self, dx, dy, dt):
+        if not self.alive: return
+        self.x = max(self.w / 2, min(WORLD_W - self.w / 2, self.x))
+        self.y = max(self.h / 2, min(WORLD_H - self.h / 2, self.y))
+
         if dx!=0 or dy!=0:
             mag = math.hypot(dx,dy) or 1
-            nx = self.x + (dx/mag)*self.speed
-            ny = self.y + (dy/mag)*self.speed
+            nx = self.x + (dx/mag)*self.speed*dt
+            ny = self.y + (dy/mag)*self.speed*dt
  
             oldx, oldy = self.x, self.y
             self.x = nx
-            if self.rect().collidelist(wall_rects) != -1: self.x = oldx
+            if wall_index.collides(self.rect()): self.x = oldx
             self.y = ny
-            if self.rect().collidelist(wall_rects) != -1: self.y = oldy
+            if wall_index.collides(self.rect()): self.y = oldy
             self.x = clamp(self.x, 10, WORLD_W-10)
             self.y = clamp(self.y, 10, WORLD_H-10)
 
-    def draw(self, surf, camx, camy):
-        sx, sy = world_to_screen(self.x, self.y, camx, camy)
-
-        pygame.draw.circle(surf, (255,220,180), (sx, sy-8), 6)   
-        pygame.draw.rect(surf, self.color, (sx-8, sy-6, 16, 18)) 
-
 class Bot(Entity):
     def __init__(self, x, y, idx):
         super().__init__(x, y, 26, 26, (240, 100, 100))
@@ -250,7 +871,7 @@ class Bot(Entity):
         dx = tx - self.x
         dy = ty - self.y
         d = math.hypot(dx, dy) or 1
-        step = min(self.speed, d)
+        step = min(self.speed * dt, d)
 
         new_x = self.x + (dx / d) * step
         new_y = self.y + (dy / d) * step
@@ -260,7 +881,7 @@ class Bot(Entity):
 
         if 0 <= cell_x < COLS and 0 <= cell_y < ROWS:
             test_rect = pygame.Rect(new_x - self.w/2, new_y - self.h/2, self.w, self.h)
-            if test_rect.collidelist(wall_rects) == -1:
+            if not wall_index.collides(test_rect):
                 self.x = new_x
                 self.y = new_y
             else:
@@ -273,17 +894,46 @@ class Bot(Entity):
         if d < 4:
             self.path.pop(0)
 
-    def draw(self, surf, camx, camy):
-        sx, sy = world_to_screen(self.x, self.y, camx, camy)
-        pygame.draw.circle(surf, (255, 200, 200), (sx, sy - 8), 6)
-        pygame.draw.rect(surf, self.color, (sx - 8, sy - 6, 16, 18))
+    def steer_to(self, x, y, dt):
+        """Walk straight at (x, y), sliding along walls."""
+        dx = x - self.x
+        dy = y - self.y
+        mag = math.hypot(dx, dy) or 1
+        nx = self.x + (dx / mag) * self.speed * dt
+        ny = self.y + (dy / mag) * self.speed * dt
+
+        oldx, oldy = self.x, self.y
+        self.x = nx
+        if wall_index.collides(self.rect()):
+            self.x = oldx
+        self.y = ny
+        if wall_index.collides(self.rect()):
+            self.y = oldy
+
+    def coast(self, player, dt):
+        """Move without deciding anything (see AIScheduler): timers run and the
+        bot keeps to its cached path, or heads straight for the player."""
+        if not self.alive or not player.alive:
+            return
+        self.path_timer -= dt
+        self.shoot_cooldown -= dt
+        if not self.path:
+            # a flow field toward the player's cell is shared by everyone, so
+            # reading a new path off it is not a search
+            field = flow_fields.peek((int(player.x // CELL_SIZE), int(player.y // CELL_SIZE)))
+            if field is not None:
+                self.path = field.path_from(self.grid_pos())
+        if self.path:
+            self.follow_path(dt)
+        else:
+            self.steer_to(player.x, player.y, dt)
 
-    def update(self, entities, bullets, dt):
+    def update(self, player, crowd, bullets, dt):
+        """Think for dt: player is the one everyone hunts, crowd the EntityGrid of live players and bots."""
         if not self.alive:
             return
         #
         # اجعل البوت يستهدف اللاعب فقط
-        player = entities[0]  # أول عنصر في القائمة هو اللاعب (راجع في الـ game loop)
         if not player.alive:
             return  # لو اللاعب مات البوت يقف أو يلف عشوائي
 
@@ -304,26 +954,11 @@ class Bot(Entity):
         self.path_timer -= dt
         if self.path_timer <= 0:
             self.path_timer = 0.25  
-            start = self.grid_pos()
             goal = (int(nearest.x // CELL_SIZE), int(nearest.y // CELL_SIZE))
-            self.path = astar_path(start, goal)
-            if self.path and self.path[0] == start:
-                self.path.pop(0)
+            self.path = flow_fields.get(goal).path_from(self.grid_pos())
 
         if not self.path:
-            dx = nearest.x - self.x
-            dy = nearest.y - self.y
-            mag = math.hypot(dx, dy) or 1
-            nx = self.x + (dx / mag) * self.speed
-            ny = self.y + (dy / mag) * self.speed
-
-            oldx, oldy = self.x, self.y
-            self.x = nx
-            if self.rect().collidelist(wall_rects) != -1:
-                self.x = oldx
-            self.y = ny
-            if self.rect().collidelist(wall_rects) != -1:
-                self.y = oldy
+            self.steer_to(nearest.x, nearest.y, dt)
         else:
             self.follow_path(dt)
 
@@ -343,18 +978,17 @@ class Bot(Entity):
             if not self.alive:
                 return
 
-            targets = [e for e in entities if e is not self and getattr(e, 'alive', True)]
-            if not targets:
+            found = crowd.nearest(self.x, self.y, exclude=self)
+            if not found:
 
-                if random.random() < 0.05: 
+                if random.random() < 3.0 * dt:
                     nx = clamp(self.x + random.uniform(-100, 100), 10, WORLD_W - 10)
                     ny = clamp(self.y + random.uniform(-100, 100), 10, WORLD_H - 10)
-                    self.path = astar_path(self.grid_pos(), (int(nx // CELL_SIZE), int(ny // CELL_SIZE)))
+                    request_route(self, (int(nx // CELL_SIZE), int(ny // CELL_SIZE)))
                 self.follow_path(dt)
                 return
 
-            nearest = min(targets, key=lambda t: dist((self.x, self.y), (t.x, t.y)))
-            d = dist((self.x, self.y), (nearest.x, nearest.y))
+            d, nearest = found[0]
 
             if self.state == "idle":
                 if d < 350 and line_of_sight((self.x, self.y), (nearest.x, nearest.y)):
@@ -366,11 +1000,8 @@ class Bot(Entity):
                 self.path_timer -= dt
                 if self.path_timer <= 0:
                     self.path_timer = 0.3 + random.random() * 0.2
-                    start = self.grid_pos()
                     goal = (int(nearest.x // CELL_SIZE), int(nearest.y // CELL_SIZE))
-                    self.path = astar_path(start, goal)
-                    if self.path and self.path[0] == start:
-                        self.path.pop(0)
+                    request_route(self, goal)
 
                 if d < 220 and line_of_sight((self.x, self.y), (nearest.x, nearest.y)):
                     self.state = "attack"
@@ -387,7 +1018,7 @@ class Bot(Entity):
                         ty = nearest.y + random.uniform(-10, 10)
                         bullets.append(Bullet(self.x, self.y, tx, ty, owner=self))
                         self.shoot_cooldown = random.uniform(0.7, 1.3)
-                    if random.random() < 0.05:
+                    if random.random() < 3.0 * dt:
                         self.follow_path(dt)
 
 class Bullet:
@@ -397,364 +1028,1313 @@ class Bullet:
         self.vx = (dx/mag)*BULLET_SPEED; self.vy = (dy/mag)*BULLET_SPEED
         self.r = 4; self.alive=True; self.damage = 8 if isinstance(owner, Bot) else 32
         self.bounces = 0
+        self.id = next(bullet_ids)
     def update(self, dt):
         if not self.alive: return
-        nx = self.x + self.vx
-        ny = self.y + self.vy
-        r = pygame.Rect(int(nx-self.r), int(ny-self.r), self.r*2, self.r*2)
-        hit_any = None
-        for wr in wall_rects:
-            if r.colliderect(wr):
-                hit_any = wr; break
-        if hit_any:
-
-            overlap_x = max(0, min(nx+self.r, hit_any.right) - max(nx-self.r, hit_any.left))
-            overlap_y = max(0, min(ny+self.r, hit_any.bottom) - max(ny-self.r, hit_any.top))
-            if overlap_y >= overlap_x:
-                self.vy = -self.vy * BOUNCE_ENERGY_LOSS
-            else:
-                self.vx = -self.vx * BOUNCE_ENERGY_LOSS
+        # every wall the bullet can reach this tick, whatever it bounces off first
+        reach = math.hypot(self.vx, self.vy) * dt + self.r + 1
+        near = pygame.Rect(int(self.x - reach), int(self.y - reach), int(2 * reach) + 1, int(2 * reach) + 1)
+        walls = wall_index.query(near)
+        left = dt
+        while True:
+            dx = self.vx * left; dy = self.vy * left
+            hit = sweep_circle(self.x, self.y, dx, dy, self.r, walls)
+            if hit is None:
+                self.x += dx; self.y += dy
+                break
+            t, nx, ny = hit
+            self.x += dx * t + nx * BOUNCE_SKIN
+            self.y += dy * t + ny * BOUNCE_SKIN
+            vn = self.vx * nx + self.vy * ny
+            self.vx -= (1 + BOUNCE_ENERGY_LOSS) * vn * nx
+            self.vy -= (1 + BOUNCE_ENERGY_LOSS) * vn * ny
             self.bounces += 1
-            speed_mag = math.hypot(self.vx, self.vy)
-            if self.bounces >= MAX_BOUNCES or speed_mag < 3:
+            if self.bounces >= MAX_BOUNCES or math.hypot(self.vx, self.vy) < BULLET_MIN_SPEED:
                 self.alive = False
                 return
-            self.x += self.vx * 0.4
-            self.y += self.vy * 0.4
-            return
-        self.x = nx; self.y = ny
+            left *= 1 - t
         if self.x < -40 or self.x > WORLD_W+40 or self.y < -40 or self.y > WORLD_H+40:
             self.alive = False
 
-class Pickup(Entity):
-    def __init__(self,x,y,typ):
-        col = (200,200,50) if typ=="ammo" else (100,255,120)
-        super().__init__(x,y,18,18,col); self.typ=typ
+def sweep_circle(x, y, dx, dy, r, walls):
+    """First contact of a circle of radius r at (x, y) moving by (dx, dy) with walls.
+
+    Returns (t, nx, ny), the fraction of the move done at contact and the
+    wall's outward normal there, or None. Each wall is swept as the rounded
+    box it forms with the circle: a slab test against the rect grown by r,
+    then a ray-circle test when the entry point falls on a corner. Walls the
+    circle already overlaps are ignored, so nothing gets stuck inside one.
+    """
+    best = None
+    first = 1.0
+    for wr in walls:
+        l, top, rt, bot = wr.left, wr.top, wr.right, wr.bottom
+        if dx:
+            a = (l - r - x) / dx; b = (rt + r - x) / dx
+            tx0, tx1 = (a, b) if a < b else (b, a)
+        elif l - r < x < rt + r:
+            tx0, tx1 = -math.inf, math.inf
+        else:
+            continue
+        if dy:
+            a = (top - r - y) / dy; b = (bot + r - y) / dy
+            ty0, ty1 = (a, b) if a < b else (b, a)
+        elif top - r < y < bot + r:
+            ty0, ty1 = -math.inf, math.inf
+        else:
+            continue
+        t0 = max(tx0, ty0); t1 = min(tx1, ty1)
+        if t0 > t1 or t1 < 0 or t0 > first:
+            continue
+        inside = t0 < 0
+        if inside:
+            t0 = 0.0
+        px = x + dx * t0; py = y + dy * t0
+        cx = l if px < l else rt if px > rt else None
+        cy = top if py < top else bot if py > bot else None
+        if cx is not None and cy is not None:
+            # rounded corner: solve |p + d t - c| = r
+            ox = x - cx; oy = y - cy
+            qa = dx * dx + dy * dy
+            qb = ox * dx + oy * dy
+            disc = qb * qb - qa * (ox * ox + oy * oy - r * r)
+            if disc < 0 or not qa:
+                continue
+            t0 = (-qb - math.sqrt(disc)) / qa
+            if t0 < 0 or t0 > first:
+                continue
+            nx = (ox + dx * t0) / r; ny = (oy + dy * t0) / r
+        elif inside:
+            continue
+        elif tx0 > ty0:
+            nx = -1.0 if dx > 0 else 1.0; ny = 0.0
+        else:
+            nx = 0.0; ny = -1.0 if dy > 0 else 1.0
+        first = t0
+        best = (t0, nx, ny)
+    return best
+
+def sweep_circles(pos, move, box, r):
+    """sweep_circle for many (circle, wall) pairs at once.
+
+    pos and move are (k, 2), box the (k, 4) left/top/right/bottom of each
+    pair's wall. Returns t (k,), inf where the pair does not touch, and the
+    (k, 2) contact normals.
+    """
+    x, y = pos[:, 0], pos[:, 1]
+    dx, dy = move[:, 0], move[:, 1]
+    l, top, rt, bot = box[:, 0], box[:, 1], box[:, 2], box[:, 3]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tx0, tx1 = _slab(x, dx, l - r, rt + r)
+        ty0, ty1 = _slab(y, dy, top - r, bot + r)
+    t = np.maximum(tx0, ty0)
+    hit = (t <= np.minimum(tx1, ty1)) & (t <= 1)
+    inside = t < 0
+    t = np.where(hit & ~inside, t, np.inf)
+    face_x = tx0 > ty0
+    normal = np.stack([np.where(face_x, -np.sign(dx), 0.0), np.where(face_x, 0.0, -np.sign(dy))], axis=1)
+
+    # entry points on a corner of the grown rect: the rounded corner decides
+    t0 = np.maximum(t, 0.0)
+    t0 = np.where(inside, 0.0, t0)
+    px = x + dx * t0; py = y + dy * t0
+    corner = hit & ((px < l) | (px > rt)) & ((py < top) | (py > bot))
+    if corner.any():
+        c = np.nonzero(corner)[0]
+        ox = x[c] - np.where(px[c] < l[c], l[c], rt[c])
+        oy = y[c] - np.where(py[c] < top[c], top[c], bot[c])
+        cdx, cdy = dx[c], dy[c]
+        qa = cdx * cdx + cdy * cdy
+        qb = ox * cdx + oy * cdy
+        disc = qb * qb - qa * (ox * ox + oy * oy - r * r)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            tc = (-qb - np.sqrt(np.maximum(disc, 0))) / qa
+        ok = (disc >= 0) & (qa > 0) & (tc >= 0) & (tc <= 1)
+        t[c] = np.where(ok, tc, np.inf)
+        normal[c, 0] = (ox + cdx * tc) / r
+        normal[c, 1] = (oy + cdy * tc) / r
+    return t, normal
+
+def _slab(x, dx, lo, hi):
+    """Entry and exit times of x + dx * t through [lo, hi] (-inf/inf or inf/-inf when dx is 0)."""
+    a = (lo - x) / dx; b = (hi - x) / dx
+    t0 = np.minimum(a, b); t1 = np.maximum(a, b)
+    still = dx == 0
+    if still.any():
+        span = (lo < x) & (x < hi)
+        t0 = np.where(still, np.where(span, -np.inf, np.inf), t0)
+        t1 = np.where(still, np.where(span, np.inf, -np.inf), t1)
+    return t0, t1
+
+OWNER_PLAYER = 1
+OWNER_BOT = 2
+
+class BulletList:
+    """Per-object bullet store, used when NumPy is not available."""
+    def __init__(self):
+        self.items = []
+
+    def __len__(self):
+        return len(self.items)
+
+    def append(self, bullet):
+        self.items.append(bullet)
 
-# ---------- Pathfinding A* ----------
-def dir_between(a,b):
-    ax,ay=a; bx,by=b
-    if bx==ax and by==ay-1: return 0
-    if bx==ax+1 and by==ay: return 1
-    if bx==ax and by==ay+1: return 2
-    if bx==ax-1 and by==ay: return 3
-    return 0
+    def update(self, dt):
+        for bu in self.items:
+            bu.update(dt)
+        self.items = [bu for bu in self.items if bu.alive]
+
+    def resolve_hits(self, player, crowd):
+        """Apply bullet damage; returns the bots killed this tick, in order.
+
+        crowd is the EntityGrid of live players and bots; bots killed here
+        are taken out of it.
+        """
+        killed = []
+        for bu in self.items:
+            if not bu.alive:
+                continue
+            if bu.owner == "player":
+                for b in crowd.query(bu.x, bu.y, HIT_QUERY_RADIUS, exclude=player):
+                    if isinstance(b, Bot) and dist((bu.x, bu.y), (b.x, b.y)) < b.w/2 + bu.r:
+                        b.health -= bu.damage
+                        bu.alive = False
+                        if b.health <= 0:
+                            b.alive = False
+                            crowd.remove(b)
+                            killed.append(b)
+                        break
+            elif isinstance(bu.owner, Bot):
+                if player.alive and dist((bu.x, bu.y), (player.x, player.y)) < player.w/2 + bu.r:
+                    player.health -= bu.damage
+                    bu.alive = False
+                    if player.health <= 0:
+                        player.alive = False
+        self.items = [bu for bu in self.items if bu.alive]
+        return killed
+
+    def positions(self, back=0.0):
+        """(x, y, fired_by_player) for every live bullet, rewound back seconds along its velocity."""
+        return [(bu.x - bu.vx*back, bu.y - bu.vy*back, bu.owner == "player") for bu in self.items]
+
+    def ids(self):
+        """Entity id of every live bullet, in positions() order."""
+        return [bu.id for bu in self.items]
+
+class BulletSystem:
+    """Struct-of-arrays bullet store updated with batched NumPy operations.
+
+    Bullets are still created as Bullet objects (which work out velocity and
+    damage) and copied into the arrays by append(). Wall bounces follow
+    Bullet.update exactly, using the WallIndex cell table as broadphase.
+    """
+    def __init__(self, capacity=256):
+        if not self.supports(wall_index):
+            raise ValueError("BulletSystem needs NumPy and a flat WallIndex")
+        self.n = 0
+        self.r = 4
+        self.pos = np.zeros((capacity, 2))
+        self.vel = np.zeros((capacity, 2))
+        self.bounces = np.zeros(capacity, np.int32)
+        self.damage = np.zeros(capacity)
+        self.kind = np.zeros(capacity, np.int8)
+        self.owner = np.empty(capacity, object)
+        self.id = np.zeros(capacity, np.int64)
 
-def neighbors(cell):
-    x, y = cell
-    dirs = [(-1,0),(1,0),(0,-1),(0,1)] 
-    result = []
+    @staticmethod
+    def supports(index):
+        """Whether bullets can run on index: update() reads its (walls, table)
+        arrays, and a chunked world has no global wall table to build them from."""
+        return np is not None and not isinstance(index, ChunkedWallIndex)
+
+    def __len__(self):
+        return self.n
+
+    def _grow(self):
+        cap = len(self.pos) * 2
+        for name in ("pos", "vel", "bounces", "damage", "kind", "owner", "id"):
+            old = getattr(self, name)
+            new = np.zeros((cap,) + old.shape[1:], old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, name, new)
+
+    def append(self, bullet):
+        if self.n == len(self.pos):
+            self._grow()
+        i = self.n
+        self.pos[i] = bullet.x, bullet.y
+        self.vel[i] = bullet.vx, bullet.vy
+        self.bounces[i] = bullet.bounces
+        self.damage[i] = bullet.damage
+        self.kind[i] = OWNER_PLAYER if bullet.owner == "player" else OWNER_BOT if isinstance(bullet.owner, Bot) else 0
+        self.owner[i] = bullet.owner
+        self.id[i] = bullet.id
+        self.n += 1
+
+    def _keep(self, mask):
+        n = int(mask.sum())
+        if n == self.n:
+            return
+        for name in ("pos", "vel", "bounces", "damage", "kind", "owner", "id"):
+            arr = getattr(self, name)
+            arr[:n] = arr[:self.n][mask]
+        self.owner[n:self.n] = None
+        self.n = n
 
-    for dx, dy in dirs:
-        nx, ny = x + dx, y + dy
+    def update(self, dt):
+        n = self.n
+        if not n:
+            return
+        walls, table = wall_index.arrays()
+        cs = wall_index.cell_size
+        cols, rows = wall_index.cols, wall_index.rows
+        r = self.r
+        pos = self.pos[:n]; vel = self.vel[:n]; bounces = self.bounces[:n]
+
+        # candidate walls: every cell within reach this tick, whatever is bounced off first
+        reach = np.hypot(vel[:, 0], vel[:, 1]) * dt + r + 1
+        x0 = np.clip((pos[:, 0] - reach) // cs, 0, cols - 1).astype(np.intp)
+        x1 = np.clip((pos[:, 0] + reach) // cs, 0, cols - 1).astype(np.intp)
+        y0 = np.clip((pos[:, 1] - reach) // cs, 0, rows - 1).astype(np.intp)
+        y1 = np.clip((pos[:, 1] + reach) // cs, 0, rows - 1).astype(np.intp)
+        gx = np.minimum(x0[:, None] + np.arange(int((x1 - x0).max()) + 1), x1[:, None])
+        gy = np.minimum(y0[:, None] + np.arange(int((y1 - y0).max()) + 1), y1[:, None])
+        cells = (gy[:, :, None] * cols + gx[:, None, :]).reshape(n, -1)
+        cand = table[cells].reshape(n, -1)
+        pair_b, slot = np.nonzero(cand >= 0)
+        pair_box = walls[cand[pair_b, slot]]
+        px = pos[pair_b, 0]; py = pos[pair_b, 1]; pr = reach[pair_b]
+        near = ((pair_box[:, 0] < px + pr) & (pair_box[:, 2] > px - pr)
+                & (pair_box[:, 1] < py + pr) & (pair_box[:, 3] > py - pr))
+        pair_b = pair_b[near]
+        pair_box = pair_box[near]
+
+        alive = np.ones(n, bool)
+        left = np.full(n, dt)
+        moving = np.zeros(n, bool)
+        moving[pair_b] = True
+        # nothing in reach: the whole move at once
+        free = ~moving
+        pos[free] += vel[free] * dt
+        idx = np.nonzero(moving)[0]
+        # each pass either finishes a bullet's move or bounces it, and MAX_BOUNCES bounces kill
+        for _ in range(MAX_BOUNCES):
+            if not len(idx):
+                break
+            moving[:] = False
+            moving[idx] = True
+            p = np.nonzero(moving[pair_b])[0]
+            first_t = np.full(n, np.inf)
+            first_n = np.zeros((n, 2))
+            if len(p):
+                b = pair_b[p]
+                t, normal = sweep_circles(pos[b], vel[b] * left[b, None], pair_box[p], r)
+                order = np.lexsort((t, b))
+                sb = b[order]
+                best = order[np.r_[True, sb[1:] != sb[:-1]]]
+                first_t[b[best]] = t[best]
+                first_n[b[best]] = normal[best]
+            hit = first_t[idx] <= 1
+            miss = idx[~hit]
+            pos[miss] += vel[miss] * left[miss, None]
+            h = idx[hit]; th = first_t[h]; nh = first_n[h]
+            pos[h] += vel[h] * (left[h] * th)[:, None] + nh * BOUNCE_SKIN
+            vn = (vel[h] * nh).sum(axis=1)
+            vel[h] -= ((1 + BOUNCE_ENERGY_LOSS) * vn)[:, None] * nh
+            bounces[h] += 1
+            dead = (bounces[h] >= MAX_BOUNCES) | (np.hypot(vel[h, 0], vel[h, 1]) < BULLET_MIN_SPEED)
+            alive[h[dead]] = False
+            left[h] *= 1 - th
+            idx = h[~dead]
+
+        alive &= ~((pos[:, 0] < -40) | (pos[:, 0] > WORLD_W + 40) | (pos[:, 1] < -40) | (pos[:, 1] > WORLD_H + 40))
+        self._keep(alive)
+
+    def resolve_hits(self, player, crowd):
+        """Apply bullet damage; returns the bots killed this tick, in order (see BulletList.resolve_hits)."""
+        n = self.n
+        if not n:
+            return []
+        pos = self.pos[:n]; kind = self.kind[:n]
+        alive = np.ones(n, bool)
+        killed = []
+
+        # the player's bullets are few: each one asks the grid for the bots around it
+        for i in np.nonzero(kind == OWNER_PLAYER)[0].tolist():
+            x, y = pos[i].tolist()
+            for b in crowd.query(x, y, HIT_QUERY_RADIUS, exclude=player):
+                if isinstance(b, Bot) and math.hypot(x - b.x, y - b.y) < b.w/2 + self.r:
+                    b.health -= float(self.damage[i])
+                    alive[i] = False
+                    if b.health <= 0:
+                        b.alive = False
+                        crowd.remove(b)
+                        killed.append(b)
+                    break
 
+        theirs = np.nonzero(kind == OWNER_BOT)[0]
+        if player.alive and len(theirs):
+            d = np.hypot(pos[theirs, 0] - player.x, pos[theirs, 1] - player.y)
+            for i in theirs[d < player.w/2 + self.r]:
+                if not player.alive:
+                    break
+                player.health -= float(self.damage[i])
+                alive[i] = False
+                if player.health <= 0:
+                    player.alive = False
 
-        if not (0 <= nx < COLS and 0 <= ny < ROWS):
-            continue
+        self._keep(alive)
+        return killed
 
+    def positions(self, back=0.0):
+        """(x, y, fired_by_player) for every live bullet, rewound back seconds along its velocity."""
+        n = self.n
+        pos = self.pos[:n] - self.vel[:n] * back if back else self.pos[:n]
+        return list(zip(pos[:, 0].tolist(), pos[:, 1].tolist(), (self.kind[:n] == OWNER_PLAYER).tolist()))
 
-        try:
-            if not maze[y][x][dir_between((x,y),(nx,ny))] and not maze[ny][nx][dir_between((nx,ny),(x,y))]:
-                result.append((nx, ny))
-        except IndexError:
+    def ids(self):
+        """Entity id of every live bullet, in positions() order."""
+        return self.id[:self.n].tolist()
 
-            continue
+def make_bullets():
+    return BulletSystem() if BulletSystem.supports(wall_index) else BulletList()
 
-    return result
+class Pickup(Entity):
+    def __init__(self,x,y,typ):
+        col = (200,200,50) if typ=="ammo" else (100,255,120)
+        super().__init__(x,y,18,18,col); self.typ=typ
+        self.id = next(pickup_ids)
+
+# ---------- Pathfinding A* ----------
+ASTAR_MAX_ITERS = 50000      # expansions before giving up in a ChunkedMaze (flat mazes search to the end)
 
 def astar_path(start, goal):
+    profiler.count("astar")
+    ai_work["searches"] += 1
     if start == goal:
         return []
 
-    sx, sy = start
-    gx, gy = goal
-
-    ROWS = len(maze)
-    COLS = len(maze[0])
-
-    sx = max(0, min(COLS - 1, sx))
-    sy = max(0, min(ROWS - 1, sy))
-    gx = max(0, min(COLS - 1, gx))
-    gy = max(0, min(ROWS - 1, gy))
-
-    if maze[sy][sx] == 1 or maze[gy][gx] == 1:
-        return []
+    sx = max(0, min(COLS - 1, start[0]))
+    sy = max(0, min(ROWS - 1, start[1]))
+    gx = max(0, min(COLS - 1, goal[0]))
+    gy = max(0, min(ROWS - 1, goal[1]))
+    s = sy * COLS + sx
+    g = gy * COLS + gx
 
     import heapq
-    open_set = []
-    heapq.heappush(open_set, (0, (sx, sy)))
+    adj = maze.adj
+    open_set = [(abs(sx - gx) + abs(sy - gy), s)]
     came_from = {}
-    gscore = {(sx, sy): 0}
-    fscore = {(sx, sy): abs(sx - gx) + abs(sy - gy)}
-    max_iters = COLS * ROWS * 4
+    gscore = {s: 0}
+    max_iters = ASTAR_MAX_ITERS if isinstance(maze, ChunkedMaze) else COLS * ROWS * 4
     iters = 0
 
     while open_set and iters < max_iters:
         iters += 1
         _, current = heapq.heappop(open_set)
 
-        if current == (gx, gy):
+        if current == g:
             path = []
             c = current
             while c in came_from:
-                path.append(c)
+                path.append((c % COLS, c // COLS))
                 c = came_from[c]
             path.reverse()
             return path
 
-        for nb in neighbors(current):
-            cx, cy = nb
-
-            if not (0 <= cx < COLS and 0 <= cy < ROWS):
-                continue
-
-            if maze[cy][cx] == 1:
-                continue
-
-            tentative = gscore[current] + 1
+        tentative = gscore[current] + 1
+        for nb in adj[current]:
             if tentative < gscore.get(nb, 1e9):
                 came_from[nb] = current
                 gscore[nb] = tentative
-                f = tentative + abs(nb[0] - gx) + abs(nb[1] - gy)
-                if nb not in fscore or f < fscore[nb]:
-                    fscore[nb] = f
-                    heapq.heappush(open_set, (f, nb))
+                heapq.heappush(open_set, (tentative + abs(nb % COLS - gx) + abs(nb // COLS - gy), nb))
 
     return []
 
+# ---------- Hierarchical pathfinding (HPA*) ----------
+HPA_CLUSTER = 10
+HPA_GOAL_CACHE = 32          # goals whose abstract cost-to-go is kept
+
+class HierarchicalPlanner:
+    """HPA* over fixed square clusters of maze cells.
+
+    Built once per maze: every run of open cells along a cluster border
+    becomes an entrance (a pair of nodes joined by a cost-1 edge), and the
+    entrances of each cluster are linked by their in-cluster BFS distance.
+    find_path() plans on that small graph with one cost-to-go per goal cell
+    (a Dijkstra from the goal, run only as far as the starts asked about so
+    far need and kept for the most recent goals), and only refines the cell
+    path up to the point where it leaves the start cluster.
+    """
+    def __init__(self, maze, size=HPA_CLUSTER, goal_cache=HPA_GOAL_CACHE):
+        self.maze = maze
+        self.size = size
+        self.ccols = (maze.cols + size - 1) // size
+        self.crows = (maze.rows + size - 1) // size
+        self.cluster_nodes = [[] for _ in range(self.ccols * self.crows)]
+        self.edges = {}
+        self.goal_cache = goal_cache
+        self.goal_fields = collections.OrderedDict()   # goal cell -> _goal_field, least recent first
+        self.expansions = 0
+        self._build()
+
+    def cluster_of(self, i):
+        cols = self.maze.cols
+        return (i // cols // self.size) * self.ccols + (i % cols) // self.size
+
+    def _bounds(self, cid):
+        cx, cy = cid % self.ccols, cid // self.ccols
+        x0, y0 = cx * self.size, cy * self.size
+        return x0, y0, min(x0 + self.size, self.maze.cols), min(y0 + self.size, self.maze.rows)
+
+    def _add_node(self, i):
+        if i not in self.edges:
+            self.edges[i] = []
+            self.cluster_nodes[self.cluster_of(i)].append(i)
+
+    def _add_entrance(self, a, b):
+        self._add_node(a); self._add_node(b)
+        self.edges[a].append((b, 1))
+        self.edges[b].append((a, 1))
+
+    def _scan_border(self, cells, d, step):
+        # cells: border cells on the near side; d: direction across the border
+        run = []
+        for i in cells + [None]:
+            if i is not None and self.maze.open[i] >> d & 1:
+                run.append(i)
+                continue
+            if run:
+                picks = {run[0], run[-1]} if len(run) >= 6 else {run[len(run) // 2]}
+                for a in picks:
+                    self._add_entrance(a, a + step)
+                run = []
+
+    def _build(self):
+        cols, rows, size = self.maze.cols, self.maze.rows, self.size
+        for x in range(size - 1, cols - 1, size):
+            for y0 in range(0, rows, size):
+                self._scan_border([y * cols + x for y in range(y0, min(y0 + size, rows))], 1, 1)
+        for y in range(size - 1, rows - 1, size):
+            for x0 in range(0, cols, size):
+                self._scan_border([y * cols + x for x in range(x0, min(x0 + size, cols))], 2, cols)
+        for cid, nodes in enumerate(self.cluster_nodes):
+            for a in nodes:
+                dist, _ = self._search(a, cid)
+                for b in nodes:
+                    if b != a and b in dist:
+                        self.edges[a].append((b, dist[b]))
+
+    def _search(self, src, cid):
+        """BFS from src that never leaves cluster cid: (dist, parent) dicts."""
+        x0, y0, x1, y1 = self._bounds(cid)
+        cols, adj = self.maze.cols, self.maze.adj
+        dist = {src: 0}
+        parent = {}
+        frontier = [src]
+        while frontier:
+            nxt = []
+            for i in frontier:
+                for j in adj[i]:
+                    if j not in dist and x0 <= j % cols < x1 and y0 <= j // cols < y1:
+                        dist[j] = dist[i] + 1
+                        parent[j] = i
+                        nxt.append(j)
+            frontier = nxt
+        return dist, parent
+
+    def _cells_between(self, a, b, parent):
+        path = []
+        while b != a:
+            path.append(b)
+            b = parent[b]
+        path.reverse()
+        return path
+
+    def _goal_field(self, g, cg):
+        """Cost-to-go toward g over the abstract graph, as a resumable Dijkstra.
+
+        (dist, next, heap, settled): next[n] is the node after n on the way to
+        g, None for the entrances of g's own cluster, which reach it by dg.
+        """
+        field = self.goal_fields.pop(g, None)
+        if field is None:
+            dg, _ = self._search(g, cg)
+            dist = {n: d for n, d in dg.items() if n in self.edges}
+            field = (dist, dict.fromkeys(dist), [(d, n) for n, d in dist.items()], set())
+            heapq.heapify(field[2])
+        self.goal_fields[g] = field
+        if len(self.goal_fields) > self.goal_cache:
+            self.goal_fields.popitem(last=False)
+        return field
+
+    def _settle(self, field, needed):
+        """Run the field's Dijkstra until every node in needed has its final cost (or is unreachable)."""
+        dist, nxt, heap, settled = field
+        waiting = set(needed) - settled
+        while waiting and heap:
+            d, n = heapq.heappop(heap)
+            if n in settled or d > dist[n]:
+                continue
+            settled.add(n)
+            waiting.discard(n)
+            self.expansions += 1
+            for m, w in self.edges[n]:
+                if d + w < dist.get(m, 1e9):
+                    dist[m] = d + w
+                    nxt[m] = n
+                    heapq.heappush(heap, (d + w, m))
+
+    def find_path(self, start, goal):
+        """Cell path from start toward goal, refined up to the first cluster exit."""
+        profiler.count("hpa")
+        ai_work["searches"] += 1
+        cols = self.maze.cols
+        s = start[1] * cols + start[0]
+        g = goal[1] * cols + goal[0]
+        if s == g:
+            return []
+        cs, cg = self.cluster_of(s), self.cluster_of(g)
+        ds, parent = self._search(s, cs)
+        if cs == cg and g in ds:
+            return [(i % cols, i // cols) for i in self._cells_between(s, g, parent)]
+
+        # one cost-to-go per goal for every start: each replan continues the
+        # route the previous one chose, so a walker always gets closer
+        field = self._goal_field(g, cg)
+        entries = [n for n in ds if n in self.edges]
+        self._settle(field, entries)
+        dist, nxt, _, settled = field
+        entries = [n for n in entries if n in settled]
+        if not entries:
+            return []
+        n = min(entries, key=lambda e: ds[e] + dist[e])
+        cells = self._cells_between(s, n, parent)
+        while nxt[n] is not None:
+            b = nxt[n]
+            if self.cluster_of(b) != cs:
+                cells.append(b)
+                break
+            _, p = self._search(n, cs)
+            cells += self._cells_between(n, b, p)
+            n = b
+        return [(i % cols, i // cols) for i in cells]
+
 # ---------- LOS helper ----------
-def line_of_sight(a,b):
-    ax,ay=a; bx,by=b
-    steps = int(dist(a,b)/6) + 1
-    for i in range(1, steps):
-        t = i/steps
-        x = ax + (bx-ax)*t; y = ay + (by-ay)*t
-        r = pygame.Rect(int(x-2), int(y-2), 4,4)
-        for wr in wall_rects:
-            if r.colliderect(wr):
-                return False
+# Exact grid traversal (Amanatides & Woo): walk the cells the segment crosses
+# and stop at the first cell edge that has a wall flag on either side.
+
+_los_cache = {}
+
+def begin_los_frame():
+    """Forget the previous tick's line_of_sight answers."""
+    _los_cache.clear()
+
+def edge_blocked(x, y, d):
+    """Wall between cell (x, y) and its neighbour in direction d (0 up, 1 right, 2 down, 3 left)."""
+    return maze.blocked(x, y, d)
+
+def grid_ray_clear(a, b):
+    ax, ay = a; bx, by = b
+    x, y = int(ax // CELL_SIZE), int(ay // CELL_SIZE)
+    ex, ey = int(bx // CELL_SIZE), int(by // CELL_SIZE)
+    dx, dy = bx - ax, by - ay
+    sx = 1 if dx > 0 else -1
+    sy = 1 if dy > 0 else -1
+    dir_x = 1 if sx > 0 else 3
+    dir_y = 2 if sy > 0 else 0
+    if dx:
+        t_dx = CELL_SIZE / abs(dx)
+        t_x = ((x + (sx > 0)) * CELL_SIZE - ax) / dx
+    else:
+        t_dx = t_x = math.inf
+    if dy:
+        t_dy = CELL_SIZE / abs(dy)
+        t_y = ((y + (sy > 0)) * CELL_SIZE - ay) / dy
+    else:
+        t_dy = t_y = math.inf
+
+    left = abs(ex - x) + abs(ey - y)
+    while left > 0:
+        if t_x < t_y:
+            if edge_blocked(x, y, dir_x): return False
+            x += sx; t_x += t_dx; left -= 1
+        elif t_y < t_x:
+            if edge_blocked(x, y, dir_y): return False
+            y += sy; t_y += t_dy; left -= 1
+        else:
+            # passing exactly through a corner: clear if either way around is open
+            via_x = not edge_blocked(x, y, dir_x) and not edge_blocked(x + sx, y, dir_y)
+            via_y = not edge_blocked(x, y, dir_y) and not edge_blocked(x, y + sy, dir_x)
+            if not (via_x or via_y): return False
+            x += sx; y += sy; t_x += t_dx; t_y += t_dy; left -= 2
     return True
 
+def line_of_sight(a, b):
+    """Clear line between world points a and b.
+
+    Answers are memoised per (cell, cell) pair until begin_los_frame(), so
+    bots asking about the same cells in one tick share a single traversal.
+    """
+    profiler.count("los")
+    ca = (int(a[0] // CELL_SIZE), int(a[1] // CELL_SIZE))
+    cb = (int(b[0] // CELL_SIZE), int(b[1] // CELL_SIZE))
+    key = (ca, cb) if ca <= cb else (cb, ca)
+    clear = _los_cache.get(key)
+    if clear is None:
+        profiler.count("los_traversals")
+        ai_work["los"] += 1
+        clear = _los_cache[key] = grid_ray_clear(a, b)
+    return clear
+
+# ---------- Shared flow field ----------
+FLOW_LOOKAHEAD = 4
+FLOW_RADIUS = 48             # field size (BFS steps from the goal) in chunked worlds
+
+class FlowField:
+    """BFS distance field toward one goal cell, shared by every bot chasing it.
+
+    Recomputed only when the goal cell changes; afterwards any bot reads its
+    next step with a single lookup instead of running its own A*.
+    """
+    def __init__(self):
+        self.goal = None
+        self.dist = []
+        self.next_cell = []
+
+    def update(self, goal):
+        if goal == self.goal:
+            return
+        profiler.count("flow_field")
+        ai_work["searches"] += 1
+        self.goal = goal
+        n = COLS * ROWS
+        chunked = isinstance(maze, ChunkedMaze)
+        if chunked:
+            # a field over the whole world would generate every chunk: stop FLOW_RADIUS
+            # steps out, in plain dicts that lookups outside the field leave alone
+            dist, next_cell = {}, {}
+            radius = FLOW_RADIUS
+        else:
+            dist = [-1] * n
+            next_cell = [-1] * n
+            radius = n
+        gx, gy = goal
+        if 0 <= gx < COLS and 0 <= gy < ROWS:
+            g = gy * COLS + gx
+            dist[g] = 0
+            frontier = [g]
+            adj = maze.adj
+            depth = 0
+            while frontier and depth < radius:
+                depth += 1
+                nxt = []
+                for i in frontier:
+                    for j in adj[i]:
+                        if (j not in dist) if chunked else (dist[j] == -1):
+                            dist[j] = depth
+                            next_cell[j] = i
+                            nxt.append(j)
+                frontier = nxt
+        self.dist = dist
+        self.next_cell = next_cell
+
+    def next_step(self, cell):
+        """Neighbour of cell one step closer to the goal, or None."""
+        x, y = cell
+        if not (0 <= x < COLS and 0 <= y < ROWS):
+            return None
+        i = y * COLS + x
+        next_cell = self.next_cell
+        j = next_cell.get(i, -1) if isinstance(next_cell, dict) else next_cell[i]
+        return (j % COLS, j // COLS) if j != -1 else None
+
+    def path_from(self, cell, max_len=FLOW_LOOKAHEAD):
+        """Next few cells toward the goal (start cell excluded), like astar_path."""
+        path = []
+        step = self.next_step(cell)
+        while step is not None and len(path) < max_len:
+            path.append(step)
+            step = self.next_step(step)
+        return path
+
+FLOW_CACHE_SIZE = 32
+
+class FlowFieldCache:
+    """Flow fields for the most recent goal cells, least recently used evicted.
+
+    One goal per match in practice, so a server running many matches on the
+    same map keeps one field per match instead of thrashing a single one.
+    """
+    def __init__(self, size=FLOW_CACHE_SIZE):
+        self.size = size
+        self.fields = collections.OrderedDict()
+
+    def get(self, goal):
+        field = self.fields.pop(goal, None)
+        if field is None:
+            field = FlowField()
+            field.update(goal)
+            if len(self.fields) >= self.size:
+                self.fields.popitem(last=False)
+        self.fields[goal] = field
+        return field
+
+    def peek(self, goal):
+        return self.fields.get(goal)
+
+def route_to(start, goal):
+    """Cell path from start to goal.
+
+    Served by a cached flow field when one already targets goal, by the HPA*
+    planner for long routes and by plain A* otherwise.
+    """
+    field = flow_fields.peek(goal)
+    if field is not None:
+        return field.path_from(start)
+    if hpa is not None and abs(goal[0] - start[0]) + abs(goal[1] - start[1]) >= HPA_CLUSTER:
+        path = hpa.find_path(start, goal)
+        if path:
+            return path
+        # entrances are sampled per border run, so a pocket of a cluster can
+        # miss them all; plain A* still knows the way out
+    path = astar_path(start, goal)
+    if path and path[0] == start:
+        path.pop(0)
+    return path
+
+def request_route(bot, goal):
+    """Replan bot toward goal (bot: anything with path and grid_pos(), e.g. the Autopilot).
+
+    Inline through route_to, unless a planner pool is attached and no flow
+    field already covers goal: then the search goes to the pool and the bot
+    keeps walking its old path until receive_routes() hands over the new one.
+    Every A* / HPA* search of the game goes through here; the only searches
+    left on the main thread with a pool attached are flow field BFS runs.
+    """
+    start = bot.grid_pos()
+    if planner is None or planner.shm is None or flow_fields.peek(goal) is not None:
+        bot.path = route_to(start, goal)
+    else:
+        planner.request(bot, start, goal)
+
+def receive_routes():
+    """Give bots the paths the planner pool finished since the last call."""
+    for bot, start, path in planner.poll():
+        # the bot kept walking meanwhile; join the new path where it is now
+        cell = bot.grid_pos()
+        if cell in path:
+            path = path[path.index(cell) + 1:]
+        bot.path = path
+
 # ---------- Ricochet helper ----------
 def choose_wall_point_for_ricochet(shooter, target):
     sx,sy=shooter; tx,ty=target
+    dx = tx - sx; dy = ty - sy
+    if dx==0 and dy==0: return None
+    mx = (sx + tx) / 2; my = (sy + ty) / 2
+    # only walls near the segment can be within 90 px of it
+    near = pygame.Rect(int(min(sx, tx)), int(min(sy, ty)), int(abs(dx)) + 1, int(abs(dy)) + 1).inflate(182, 182)
     candidates=[]
-    for wr in wall_rects:
-        cx = wr.left + wr.width/2; cy = wr.top + wr.height/2
-        dx = tx - sx; dy = ty - sy
-        if dx==0 and dy==0: continue
+    for wr in wall_index.query(near):
+        # merged walls can be long: aim at the part of the wall nearest the midpoint, not its center
+        cx = min(max(mx, wr.left), wr.right); cy = min(max(my, wr.top), wr.bottom)
         t = ((cx - sx)*dx + (cy - sy)*dy) / (dx*dx + dy*dy)
         if 0 < t < 1:
             px = sx + dx * t; py = sy + dy * t
             dperp = math.hypot(cx-px, cy-py)
             if dperp < 90:
-                candidates.append((wr, dperp))
+                candidates.append((wr, dperp, cx, cy))
     if not candidates: return None
     candidates.sort(key=lambda x:x[1])
-    wr = candidates[0][0]
-    return (wr.left + wr.width/2 + random.uniform(-6,6), wr.top + wr.height/2 + random.uniform(-6,6))
+    wr, _, cx, cy = candidates[0]
+    return (cx + random.uniform(-6,6), cy + random.uniform(-6,6))
+
+# ---------- AI scheduler ----------
+AI_SEARCH_BUDGET = 12        # path searches (A*, HPA*, flow field BFS) per tick
+AI_LOS_BUDGET = 48           # uncached line-of-sight traversals per tick
+# (distance from the player in px, think every n ticks, move every n ticks);
+# the first tier covers the screen, the last one takes everything beyond
+AI_LOD_TIERS = ((1000, 1, 1), (1800, 4, 2), (None, 15, 4))
+
+# expensive AI work done so far; AIScheduler reads it around each think
+ai_work = {"searches": 0, "los": 0}
+
+class AIScheduler:
+    """Decides which bots think and which bots move each tick.
+
+    Bots sit on a timing wheel and are only visited on the ticks their LOD
+    tier asks for: on-screen bots every tick, farther ones every few ticks,
+    moving by all the time they skipped. A visited bot thinks (the full
+    Bot.update: replans, LOS, shooting, state machine) when its tier's think
+    interval has passed and the tick's search and LOS budgets are not spent;
+    otherwise it coasts along its cached path (Bot.coast). A bot that was due
+    to think but ran out of budget goes first on the next tick, so the
+    budget is shared round robin and nobody starves. Every bot that moves is
+    re-bucketed in the crowd grid right away, so later bots see it where it is.
+    """
+    def __init__(self, search_budget=AI_SEARCH_BUDGET, los_budget=AI_LOS_BUDGET, tiers=AI_LOD_TIERS):
+        self.search_budget = search_budget
+        self.los_budget = los_budget
+        self.tiers = [(None if limit is None else limit * limit, think, move) for limit, think, move in tiers]
+        self.tick = 0
+        self.clock = 0.0
+        self.wheel = {}              # tick -> bots to visit then
+        self.waiting = []            # bots whose think was deferred, visited first next tick
+        self.scheduled = set()
+        self.last_think = {}         # bot -> tick of its last think
+        self.moved_at = {}           # bot -> clock of its last move
+        self.last = {}               # counters of the latest tick
+        self.totals = collections.Counter()
+
+    def run(self, player, bots, crowd, bullets, dt):
+        self.tick += 1
+        self.clock += dt
+        tick, clock, wheel = self.tick, self.clock, self.wheel
+        # bots not on the wheel yet (a new match, or revived), spread over the next few ticks
+        for i, b in enumerate(bots):
+            if b.alive and b not in self.scheduled:
+                self.scheduled.add(b)
+                self.last_think[b] = tick - 1 - i % 16
+                self.moved_at[b] = clock - dt
+                wheel.setdefault(tick + i % 4, []).append(b)
+
+        px, py = player.x, player.y
+        due = self.waiting + wheel.pop(tick, [])
+        self.waiting = []
+        searches = los = thinks = moves = deferred = 0
+        for b in due:
+            if not b.alive:
+                self.scheduled.discard(b)
+                continue
+            d2 = (b.x - px) ** 2 + (b.y - py) ** 2
+            for limit, think_every, move_every in self.tiers:
+                if limit is None or d2 < limit:
+                    break
+            elapsed = clock - self.moved_at[b]
+            self.moved_at[b] = clock
+            if tick - self.last_think[b] >= think_every:
+                if searches < self.search_budget and los < self.los_budget:
+                    s0, l0 = ai_work["searches"], ai_work["los"]
+                    b.update(player, crowd, bullets, elapsed)
+                    crowd.move(b)
+                    searches += ai_work["searches"] - s0
+                    los += ai_work["los"] - l0
+                    self.last_think[b] = tick
+                    thinks += 1
+                    wheel.setdefault(tick + move_every, []).append(b)
+                    continue
+                deferred += 1
+                self.waiting.append(b)
+            else:
+                wheel.setdefault(tick + move_every, []).append(b)
+            b.coast(player, elapsed)
+            crowd.move(b)
+            moves += 1
+        self.last = {"thinks": thinks, "moves": moves, "deferred": deferred,
+                     "idle": len(self.scheduled) - thinks - moves, "searches": searches, "los": los}
+        self.totals.update(self.last)
+        for name, value in self.last.items():
+            profiler.gauge("ai_" + name, value)
 
 # ---------- Setup world ----------
+maze = rooms = wall_index = static_layer = minimap = hpa = None
+wall_rects = []
+wall_cells = []              # wall_cells[i]: flat indices of the maze cells wall_rects[i] covers
+flow_fields = FlowFieldCache()
+planner = None               # optional planner_pool.PlannerPool (see use_planner)
+
+def build_world(seed=None, cols=COLS, rows=ROWS, chunk=0):
+    """Generate a maze and (re)build everything derived from it.
+
+    The world lives in module globals, like the rest of the game; calling
+    this again replaces it (e.g. a new headless match). With chunk > 0 the
+    world is a ChunkedMaze of chunk x chunk cell chunks generated on demand:
+    wall_rects, wall_cells and rooms stay empty (the chunks hold the walls), the
+    minimap shows no walls and there is no HPA* planner or planner pool.
+    """
+    global maze, rooms, wall_rects, wall_cells, wall_index, static_layer, minimap, hpa, flow_fields
+    global COLS, ROWS, WORLD_W, WORLD_H, SCALE_X, SCALE_Y
+    if seed is not None:
+        random.seed(seed)
+    COLS, ROWS = cols, rows
+    WORLD_W = COLS * CELL_SIZE
+    WORLD_H = ROWS * CELL_SIZE
+    SCALE_X = MINIMAP_WIDTH / WORLD_W
+    SCALE_Y = MINIMAP_HEIGHT / WORLD_H
+
+    if chunk:
+        maze = ChunkedMaze(seed or 0, COLS, ROWS, chunk)
+        rooms, wall_rects, wall_cells = [], [], []
+        wall_index = ChunkedWallIndex(maze)
+        hpa = None
+    else:
+        maze, rooms = make_maze(COLS, ROWS)
+        wall_rects, wall_cells = build_wall_rects(maze)
+        wall_index = WallIndex(wall_rects, CELL_SIZE, COLS, ROWS)
+        hpa = HierarchicalPlanner(maze)
+    static_layer = StaticLayer(wall_index)
+    minimap = Minimap(rooms, wall_rects, WORLD_W, WORLD_H)
+    flow_fields = FlowFieldCache()
+    if planner is not None:
+        if chunk:
+            planner.detach()
+        else:
+            planner.attach(maze)
+    begin_los_frame()
+
+def use_planner(workers):
+    """Send bot replans to a pool of worker processes (0 turns it back off)."""
+    global planner
+    if planner is not None:
+        planner.close()
+        planner = None
+    if workers:
+        import planner_pool
+        planner = planner_pool.PlannerPool(workers)
+        if maze is not None:
+            planner.attach(maze)
+
 def random_open_cell():
     while True:
         gx = random.randint(0,COLS-1); gy = random.randint(0,ROWS-1)
         return gx,gy
 
-px,py = random_open_cell()
-player = Player(px*CELL_SIZE + CELL_SIZE/2, py*CELL_SIZE + CELL_SIZE/2)
-bots = []
-for i in range(BOT_COUNT):
-    bx,by = random_open_cell()
-    bots.append(Bot(bx*CELL_SIZE + CELL_SIZE/2, by*CELL_SIZE + CELL_SIZE/2, i+1))
+def cell_center(cell):
+    return cell[0]*CELL_SIZE + CELL_SIZE/2, cell[1]*CELL_SIZE + CELL_SIZE/2
+
+class Match:
+    """One round: the player, the bots, bullets and pickups, and the rules.
+
+    step() advances the simulation by one tick and knows nothing about the
+    window, audio or network, so the live game and headless runs share it.
+    """
+    def __init__(self, bot_count=BOT_COUNT, pickup_count=PICKUP_COUNT):
+        self.player = Player(*cell_center(random_open_cell()))
+        self.bots = [Bot(*cell_center(random_open_cell()), i+1) for i in range(bot_count)]
+        self.bullets = make_bullets()
+        self.ai = AIScheduler()
+        self.crowd = EntityGrid()            # live player and bots
+        self.crowd.sync([self.player] + self.bots)
+        self.pickups = []
+        self.pickup_grid = EntityGrid()
+        for i in range(pickup_count):
+            self.drop(Pickup(*cell_center(random_open_cell()), random.choice(["ammo","med"])))
+        self.tick = 0
+        self.winner = None
+
+    def drop(self, pickup):
+        self.pickups.append(pickup)
+        self.pickup_grid.insert(pickup)
+
+    def fire(self, wx, wy):
+        """Player shot toward world point (wx, wy)."""
+        player = self.player
+        if player.alive and player.ammo>0:
+            self.bullets.append(Bullet(player.x, player.y, wx, wy, owner="player"))
+            player.ammo -= 1
+
+    def begin_tick(self):
+        """Remember where the player and bots are before a tick, for interpolated rendering."""
+        for e in [self.player] + self.bots:
+            e.prev_x, e.prev_y = e.x, e.y
+
+    def step(self, dt, move=(0, 0)):
+        """Advance one tick with the player moving along move = (dx, dy).
+
+        Returns False once the match has a winner.
+        """
+        player, bots, crowd = self.player, self.bots, self.crowd
+        self.tick += 1
+        begin_los_frame()
+        if isinstance(maze, ChunkedMaze) and self.tick % CHUNK_KEEP_EVERY == 1:
+            maze.keep_near(self, [(e.x, e.y) for e in [player] + bots if e.alive])
+        player.move(move[0], move[1], dt)
+        crowd.move(player)
+
+        # bots update
+        with profiler.phase("ai"):
+            if planner is not None:
+                receive_routes()
+            self.ai.run(player, bots, crowd, self.bullets, dt)
+            if planner is not None:
+                planner.flush()
+
+        with profiler.phase("physics"):
+            # bullets update
+            self.bullets.update(dt)
+
+            # bullet collisions
+            for b in self.bullets.resolve_hits(player, crowd):
+                if random.random() < 0.6:
+                    self.drop(
+                        Pickup(
+                            b.x + random.randint(-10, 10),
+                            b.y + random.randint(-10, 10),
+                            random.choice(["ammo", "med"])
+                        )
+                    )
+            crowd.sync([player])
+
+            # pickups collision
+            if player.alive:
+                taken = self.pickup_grid.query(player.x, player.y, 18)
+                for p in taken:
+                    if dist((p.x,p.y),(player.x,player.y)) < 18:
+                        if p.typ=="med": player.health = min(PLAYER_MAX_HEALTH, player.health + 40)
+                        else: player.ammo += 10
+                        self.pickup_grid.remove(p)
+                if len(self.pickup_grid) < len(self.pickups):
+                    self.pickups = [p for p in self.pickups if p in self.pickup_grid]
+        profiler.gauge("bullets", len(self.bullets))
+
+        # win condition (bots stop acting once the player is down, so that ends it too)
+        alive_entities = [e for e in ([player] + bots) if getattr(e,'alive',False)]
+        if not player.alive and alive_entities:
+            self.winner = "Bots"
+            return False
+        if len(alive_entities) <= 1:
+            if len(alive_entities)==1:
+                self.winner = "You" if alive_entities[0] is player and player.alive else "Bots"
+            else:
+                self.winner = "No one"
+            return False
+        return True
+
+# ---------- Client-side prediction ----------
+PREDICTION_BUFFER = 256      # unacknowledged inputs kept for replay
+CORRECTION_SNAP = 64         # px; larger errors teleport instead of smoothing
+CORRECTION_RATE = 12.0       # 1/s; how fast a visual correction decays
+WELCOME_TIMEOUT = 2.0        # s the client waits for the server's map before playing offline
+
+class Prediction:
+    """Moves the local player straight away and reconciles with the server.
+
+    apply() runs the input through Player.move (the same wall collision the
+    server uses) and remembers it; reconcile() resets the player to the
+    server's position after its last applied input and replays the rest.
+    Any jump this causes goes into a visual offset that decays over a few
+    frames instead of showing up as a snap.
+    """
+    def __init__(self, player, size=PREDICTION_BUFFER):
+        self.player = player
+        self.seq = 0
+        self.pending = collections.deque(maxlen=size)   # (seq, dx, dy, dt)
+        self.offset_x = self.offset_y = 0.0
+        self.corrections = 0
+
+    def apply(self, dx, dy, dt):
+        """Predict one input; returns its sequence number and the quantized dt to send."""
+        dt = input_dt(dt)
+        self.seq += 1
+        self.pending.append((self.seq, dx, dy, dt))
+        self.player.move(dx, dy, dt)
+        return self.seq, dt
+
+    def rebase(self, seq):
+        """A (re)join: the server starts from our position after input seq, so
+        nothing up to seq is replayed any more."""
+        pending = self.pending
+        while pending and pending[0][0] <= seq:
+            pending.popleft()
+
+    def reconcile(self, ack, x, y):
+        pending, p = self.pending, self.player
+        while pending and pending[0][0] <= ack:
+            pending.popleft()
+        before_x, before_y = p.x, p.y
+        p.x, p.y = x, y
+        for _, dx, dy, dt in pending:
+            p.move(dx, dy, dt)
+        ex, ey = before_x - p.x, before_y - p.y
+        if abs(ex) < 1e-6 and abs(ey) < 1e-6:
+            return
+        self.corrections += 1
+        if math.hypot(ex, ey) > CORRECTION_SNAP:
+            self.offset_x = self.offset_y = 0.0
+        else:
+            self.offset_x += ex; self.offset_y += ey
 
-bullets = []
-pickups = []
-for i in range(PICKUP_COUNT):
-    gx,gy = random_open_cell()
-    pickups.append(Pickup(gx*CELL_SIZE + CELL_SIZE/2, gy*CELL_SIZE + CELL_SIZE/2, random.choice(["ammo","med"])))
+    def smooth(self, dt):
+        k = math.exp(-CORRECTION_RATE * dt)
+        self.offset_x *= k; self.offset_y *= k
 
-start_time = time.time()
+    def view(self, alpha=1.0):
+        """Where the player should be drawn this frame, alpha of the way through the tick."""
+        x, y = self.player.lerp_pos(alpha)
+        return x + self.offset_x, y + self.offset_y
 
 # camera helper
 def world_to_screen(wx, wy, camx, camy):
     return int(wx - camx + WIDTH/2), int(wy - camy + HEIGHT/2)
 
-# ---------- Game loop ----------
-player = Player(100, 100)
-    
-    # server multiplayer client
-my_id = str(uuid.uuid4())[:8]
-net = NetworkClient(server_host="127.0.0.1", server_port=5555, client_id=my_id)
-net.connect(start_x=player.x, start_y=player.y)
-running=True; winner=None
-while running:
-
-    dt = clock.tick(FPS)/1000.0
-     #player network
-#
-    net.send_update([player.x, player.y])
-
-
-    others = net.get_other_players()
-    for pid, pos in net.get_other_players().items():
-        pygame.draw.circle(screen, (255, 255, 0), (int(pos["x"]), int(pos["y"])), 10)
-
-
-    # events
-    for e in pygame.event.get():
-        if e.type == pygame.QUIT:
-            running=False
-        elif e.type == pygame.KEYDOWN:
-            if e.key == pygame.K_ESCAPE: running=False
-            if e.key == pygame.K_SPACE:
-
-                if player.alive and player.ammo>0:
-                    mx,my = pygame.mouse.get_pos()
-                    camx, camy = player.x, player.y
-                    wx = mx - WIDTH/2 + camx
-                    wy = my - HEIGHT/2 + camy
-                    bullets.append(Bullet(player.x, player.y, wx, wy, owner="player"))
-                    player.ammo -= 1
-        elif e.type == pygame.MOUSEBUTTONDOWN and e.button==1:
-
-            if player.alive and player.ammo>0:
-                mx,my = pygame.mouse.get_pos()
-                camx, camy = player.x, player.y
-                wx = mx - WIDTH/2 + camx
-                wy = my - HEIGHT/2 + camy
-                bullets.append(Bullet(player.x, player.y, wx, wy, owner="player"))
-                player.ammo -= 1
-
-    keys = pygame.key.get_pressed()
-    player.update(keys, dt)
-    draw_full_map(screen, rooms, CELL_SIZE, MINIMAP_WIDTH, MINIMAP_HEIGHT)
-
-
-    # bots update
-    all_entities = [player] + bots
-    for b in bots:
-        b.update(all_entities, bullets, dt)
-
-# bullets update
-    for bu in bullets:
-        bu.update(dt)
-
-# bullet collisions (fixed logic)
-    for bu in bullets:  
-        if not bu.alive:
-            continue
-
-    
-        if bu.owner == "player":
-            for b in bots:
-                if not b.alive:
-                    continue
-                if dist((bu.x, bu.y), (b.x, b.y)) < b.w/2 + bu.r:
-                    b.health -= bu.damage
-                    bu.alive = False
-                    if b.health <= 0:
-                        b.alive = False
-
-                        if random.random() < 0.6:
-                            pickups.append(
-                                Pickup(
-                                    b.x + random.randint(-10, 10),
-                                    b.y + random.randint(-10, 10),
-                                    random.choice(["ammo", "med"])
-                                )
-                            )
-                    break
-
+# ---------- Text cache ----------
+TEXT_CACHE_SIZE = 1024
+
+_fonts = {}
+
+def get_font(name, size):
+    """SysFont scans the system font list, so each (name, size) is opened once."""
+    f = _fonts.get((name, size))
+    if f is None:
+        f = _fonts[(name, size)] = pygame.font.SysFont(name, size)
+    return f
+
+class TextCache:
+    """LRU of rendered text surfaces keyed on (font, text, color, antialias).
+
+    HUD and status lines mostly repeat frame to frame, so they are only
+    rasterised when their content actually changes.
+    """
+    def __init__(self, size=TEXT_CACHE_SIZE):
+        self.size = size
+        self.surfaces = collections.OrderedDict()
+        self.hits = self.misses = 0
+
+    def render(self, font, text, color, antialias=True):
+        key = (font, text, color, antialias)
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surf
+        self.misses += 1
+        profiler.count("text_renders")
+        surf = self.surfaces[key] = font.render(text, antialias, color)
+        if len(self.surfaces) > self.size:
+            self.surfaces.popitem(last=False)
+        return surf
+
+    def clear(self):
+        self.surfaces.clear()
+
+text_cache = TextCache()
+
+# ---------- Entity sprites ----------
+PLAYER_HEAD = (255,220,180)
+BOT_HEAD = (255,200,200)
+CULL_MARGIN = 48             # px beyond the screen edge an entity may still overlap it
+
+class SpriteCache:
+    """Entity graphics rendered once per look, as (surface, anchor offset) pairs.
+
+    Everything the frame draws per entity (character, pickup icon, dead
+    marker, bullet, health bar at a given fill) is baked on first use, so a
+    frame is one Surface.blits batch instead of draw calls per entity.
+    """
+    def __init__(self):
+        self.sprites = {}
+
+    def get(self, key, bake):
+        spr = self.sprites.get(key)
+        if spr is None:
+            spr = self.sprites[key] = bake()
+        return spr
+
+    def character(self, head, body):
+        def bake():
+            surf = pygame.Surface((16, 26), pygame.SRCALPHA)
+            pygame.draw.circle(surf, head, (8, 6), 6)
+            pygame.draw.rect(surf, body, (0, 8, 16, 18))
+            return surf, (-8, -14)
+        return self.get(("character", head, body), bake)
+
+    def dot(self, color, radius):
+        def bake():
+            surf = pygame.Surface((2*radius + 1, 2*radius + 1), pygame.SRCALPHA)
+            pygame.draw.circle(surf, color, (radius, radius), radius)
+            return surf, (-radius, -radius)
+        return self.get(("dot", color, radius), bake)
+
+    def pickup(self, typ, color):
+        def bake():
+            surf = pygame.Surface((18, 18), pygame.SRCALPHA)
+            surf.fill(color)
+            pygame.draw.circle(surf, (255,255,255) if typ=="ammo" else (0,0,0), (9, 9), 3)
+            return surf, (-9, -9)
+        return self.get(("pickup", typ, color), bake)
+
+    def health_bar(self, w, h, filled):
+        def bake():
+            surf = pygame.Surface((w, h))
+            surf.fill((80,80,80))
+            surf.fill((0,200,0), (0, 0, filled, h))
+            return surf, (0, 0)
+        return self.get(("bar", w, h, filled), bake)
+
+sprites = SpriteCache()
+
+# ---------- Rendering ----------
+def draw_frame(screen, font, match, view=None, alpha=1.0):
+    """Draw one frame. view is where the player is shown, if not at player.x/y
+    (client-side prediction smoothing a correction); the camera follows it.
+    alpha < 1 draws moving things that far between the previous tick
+    (Match.begin_tick) and the current one."""
+    player, bots, pickups, bullets = match.player, match.bots, match.pickups, match.bullets
 
-        elif isinstance(bu.owner, Bot):
-            if player.alive and dist((bu.x, bu.y), (player.x, player.y)) < player.w/2 + bu.r:
-                player.health -= bu.damage
-                bu.alive = False
-                if player.health <= 0:
-                    player.alive = False
-
-
-    bullets = [b for b in bullets if b.alive]
-
-
-    # pickups collision
-    for p in pickups[:]:
-        if player.alive and dist((p.x,p.y),(player.x,player.y)) < 18:
-            if p.typ=="med": player.health = min(PLAYER_MAX_HEALTH, player.health + 40)
-            else: player.ammo += 10
-            pickups.remove(p)
+    # draw world with camera centered on player
+    camx, camy = view or player.lerp_pos(alpha)
+    screen.fill(BACKGROUND_COLOR)
 
-    # win condition
-    alive_entities = [e for e in ([player] + bots) if getattr(e,'alive',False)]
-    if len(alive_entities) <= 1:
-        if len(alive_entities)==1:
-            winner = "You" if alive_entities[0] is player and player.alive else "Bots"
-        else:
-            winner = "No one"
-        running=False
+    # floor + walls from the cached static layer
+    static_layer.draw(screen, camx, camy)
 
-    # draw world with camera centered on player
-    camx, camy = player.x, player.y
-    screen.fill((12,12,25))
-
-    # floor tiles (faint)
-    start_cx = int((camx - WIDTH/2)//CELL_SIZE) - 1
-    start_cy = int((camy - HEIGHT/2)//CELL_SIZE) - 1
-    end_cx = int((camx + WIDTH/2)//CELL_SIZE) + 1
-    end_cy = int((camy + HEIGHT/2)//CELL_SIZE) + 1
-    for gx in range(max(0,start_cx), min(COLS,end_cx)):
-        for gy in range(max(0,start_cy), min(ROWS,end_cy)):
-            rx, ry = world_to_screen(gx*CELL_SIZE, gy*CELL_SIZE, camx, camy)
-            pygame.draw.rect(screen, (18,18,30), (rx, ry, CELL_SIZE-1, CELL_SIZE-1))
-
-    # walls (visible window only)
-    for wr in wall_rects:
-        # quick culling
-        if (wr.left > camx + WIDTH/2 + 50) or (wr.right < camx - WIDTH/2 - 50) or (wr.top > camy + HEIGHT/2 + 50) or (wr.bottom < camy - HEIGHT/2 - 50):
-            continue
-        rx, ry = world_to_screen(wr.left, wr.top, camx, camy)
-        pygame.draw.rect(screen, (100,100,120), (rx, ry, wr.width, wr.height))
+    # entities: culled against the camera, then one batch of baked sprites
+    batch = []
+    def put(spr, sx, sy):
+        surf, (ox, oy) = spr
+        batch.append((surf, (sx + ox, sy + oy)))
+    left = camx - WIDTH/2 - CULL_MARGIN; right = camx + WIDTH/2 + CULL_MARGIN
+    top = camy - HEIGHT/2 - CULL_MARGIN; bottom = camy + HEIGHT/2 + CULL_MARGIN
 
     # pickups
     for p in pickups:
-        sx, sy = world_to_screen(p.x, p.y, camx, camy)
-        pygame.draw.rect(screen, p.color, pygame.Rect(sx-9, sy-9, p.w, p.h))
-        pygame.draw.circle(screen, (255,255,255) if p.typ=="ammo" else (0,0,0), (sx, sy), 3)
+        if left < p.x < right and top < p.y < bottom:
+            put(sprites.pickup(p.typ, p.color), *world_to_screen(p.x, p.y, camx, camy))
 
     # bots
     for b in bots:
-        sx, sy = world_to_screen(b.x, b.y, camx, camy)
+        bx, by = b.lerp_pos(alpha) if alpha < 1 else (b.x, b.y)
+        if not (left < bx < right and top < by < bottom):
+            continue
+        sx, sy = world_to_screen(bx, by, camx, camy)
         if not b.alive:
-            pygame.draw.circle(screen, (90,90,90), (sx, sy), 10)
+            put(sprites.dot((90,90,90), 10), sx, sy)
             continue
-        b.draw(screen, camx, camy)
-        pygame.draw.rect(screen, (80,80,80), (sx-20, sy-22, 40, 6))
-        pygame.draw.rect(screen, (0,200,0), (sx-20, sy-22, 40*max(0,b.health)/BOT_MAX_HEALTH, 6))
+        put(sprites.character(BOT_HEAD, b.color), sx, sy)
+        put(sprites.health_bar(40, 6, int(40*max(0,b.health)/BOT_MAX_HEALTH)), sx-20, sy-22)
 
-    # player
-    psx, psy = world_to_screen(player.x, player.y, camx, camy)
+    # player, always at the centre of the view
+    psx, psy = world_to_screen(camx, camy, camx, camy)
     if player.alive:
-        player.draw(screen, camx, camy)
-        pygame.draw.rect(screen, (80,80,80), (psx-30, psy-42, 60, 8))
-        pygame.draw.rect(screen, (0,200,0), (psx-30, psy-42, 60*(player.health/PLAYER_MAX_HEALTH), 8))
+        put(sprites.character(PLAYER_HEAD, player.color), psx, psy)
+        put(sprites.health_bar(60, 8, int(60*(player.health/PLAYER_MAX_HEALTH))), psx-30, psy-42)
     else:
-        pygame.draw.circle(screen, (120,120,120), (psx, psy), 12)
+        put(sprites.dot((120,120,120), 12), psx, psy)
 
     # bullets
-    for bu in bullets:
-        sx, sy = world_to_screen(bu.x, bu.y, camx, camy)
-        col = (255,220,80) if str(bu.owner)=="player" or bu.owner=="player" else (255,120,120)
-        pygame.draw.circle(screen, col, (sx, sy), bu.r)
+    mine_spr, theirs_spr = sprites.dot((255,220,80), 4), sprites.dot((255,120,120), 4)
+    for bx, by, mine in bullets.positions((1 - alpha) * SIM_DT):
+        if left < bx < right and top < by < bottom:
+            put(mine_spr if mine else theirs_spr, *world_to_screen(bx, by, camx, camy))
+
+    screen.blits(batch, False)
+    profiler.count("draw_calls", 1)
+    profiler.gauge("sprites", len(batch))
 
     # HUD
     hud_text = f"HP: {int(player.health) if player.alive else 0}   Ammo: {player.ammo}   Bots Alive: {sum(1 for b in bots if b.alive)}"
-    screen.blit(font.render(hud_text, True, (230,230,230)), (8,8))
+    screen.blit(text_cache.render(font, hud_text, (230,230,230)), (8,8))
 
-    # bot status
-    yy=32
-    for i,b in enumerate(bots):
-        st = f"Bot{i+1}: {'Alive' if b.alive else 'Dead'} HP:{int(b.health) if b.alive else 0}"
-        screen.blit(font.render(st, True, (200,200,200)), (8, yy)); yy+=16
+    # bot status (lines past the bottom of the screen are not drawn at all)
+    shown = bots[:max(0, (HEIGHT - 32) // 16)]
+    screen.blits([
+        (text_cache.render(font, f"Bot{i+1}: {'Alive' if b.alive else 'Dead'} HP:{int(b.health) if b.alive else 0}", (200,200,200)),
+         (8, 32 + 16*i))
+        for i, b in enumerate(shown)
+    ], False)
+    profiler.count("draw_calls", 2)
 
     # crosshair
     mx,my = pygame.mouse.get_pos()
@@ -763,44 +2343,246 @@ while running:
     pygame.draw.line(screen, (220,220,220), (mx,my-10), (mx,my+10), 1)
 
 
-   # ---------- Draw Mini Map ----------
-    minimap_surf = pygame.Surface((MINIMAP_WIDTH, MINIMAP_HEIGHT))
-    minimap_surf.set_alpha(180)  
-    minimap_surf.fill((10,10,30))
+    # minimap: cached layers, two blits
+    minimap.draw(screen, match, (MINIMAP_X, MINIMAP_Y), view)
+    profiler.count("draw_calls", 2)
 
-# ROOM
-    font_small = pygame.font.SysFont("Consolas", 12)
-    for idx, (rx, ry, rw, rh) in enumerate(rooms):  
-        rx_px = rx * CELL_SIZE * SCALE_X
-        ry_px = ry * CELL_SIZE * SCALE_Y
-        rw_px = rw * CELL_SIZE * SCALE_X
-        rh_px = rh * CELL_SIZE * SCALE_Y
-    pygame.draw.rect(minimap_surf, (180,180,220), (rx_px, ry_px, rw_px, rh_px))
+# ---------- Game loop ----------
+def run_game():
+    from network_client import NetworkClient
+
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Fight Easy Royale v3")
+    clock = pygame.time.Clock()
+    font = get_font("Consolas", 18)
+     # music
+    pygame.mixer.init()
+    pygame.mixer.music.load("music.mp3") 
+    pygame.mixer.music.play(-1) 
+    pygame.mixer.music.set_volume(0.2)  
+
+        # server multiplayer client; the map is the server's, when it answers in time
+    my_id = str(uuid.uuid4())[:8]
+    net = NetworkClient(server_host="127.0.0.1", server_port=5555, client_id=my_id)
+    net.connect(start_x=100.0, start_y=100.0)
+    welcome = net.wait_welcome(WELCOME_TIMEOUT)
+    world = welcome[1] if welcome else None
+    if world:
+        build_world(*world)
+    else:
+        build_world()
+    match = Match()
+    player = match.player
+    player.x, player.y = 100.0, 100.0
+    prediction = Prediction(player)
+    if welcome:
+        prediction.rebase(welcome[0])
+    accumulator = 0.0
+    running=True
+    while running:
+
+        dt = clock.tick(FPS)/1000.0
+        profiler.begin_frame()
+         #player network
+    #
+        with profiler.phase("network"):
+            # non-blocking: the client's I/O thread does the actual socket work
+            welcome = net.take_welcome()
+            if welcome:
+                join_seq, new_world = welcome
+                if new_world != world:
+                    # a different server (or map) after a reconnect: rebuild, keeping our spot
+                    world = new_world
+                    build_world(*world)
+                    x, y = player.x, player.y
+                    match = Match()
+                    player = match.player
+                    player.x, player.y = x, y
+                    prediction.player = player
+                prediction.rebase(join_seq)
+            auth = net.take_authority()
+            if auth:
+                prediction.reconcile(*auth)
+            others = net.get_other_players()
+
+
+        # events
+        with profiler.phase("events"):
+            for e in pygame.event.get():
+                if e.type == pygame.QUIT:
+                    running=False
+                elif e.type == pygame.KEYDOWN:
+                    if e.key == pygame.K_ESCAPE: running=False
+                    if e.key == pygame.K_F3: profiler.toggle()
+                    if e.key == pygame.K_F4: print("trace written to", profiler.dump())
+                    if e.key == pygame.K_SPACE:
+                        mx,my = pygame.mouse.get_pos()
+                        match.fire(mx - WIDTH/2 + player.x, my - HEIGHT/2 + player.y)
+                elif e.type == pygame.MOUSEBUTTONDOWN and e.button==1:
+                    mx,my = pygame.mouse.get_pos()
+                    match.fire(mx - WIDTH/2 + player.x, my - HEIGHT/2 + player.y)
+
+            keys = pygame.key.get_pressed()
+            dx = (keys[pygame.K_d] or keys[pygame.K_RIGHT]) - (keys[pygame.K_a] or keys[pygame.K_LEFT])
+            dy = (keys[pygame.K_s] or keys[pygame.K_DOWN]) - (keys[pygame.K_w] or keys[pygame.K_UP])
+
+        # fixed-tick simulation; whatever is left over is interpolated when drawing
+        accumulator += min(dt, MAX_FRAME_TIME)
+        steps = 0
+        while running and accumulator >= SIM_DT:
+            if steps == MAX_SIM_STEPS:
+                # too far behind: drop the backlog rather than spiral
+                profiler.count("dropped_ticks", int(accumulator / SIM_DT))
+                accumulator = 0.0
+                break
+            match.begin_tick()
+            # movement is predicted here and sent to the server, so the step itself does not move the player
+            seq, sent_dt = prediction.apply(dx, dy, SIM_DT)
+            net.send_input(seq, dx, dy, sent_dt, (player.x, player.y))
+            if not match.step(SIM_DT, (0, 0)):
+                running=False
+            accumulator -= SIM_DT
+            steps += 1
+        prediction.smooth(dt)
+        alpha = accumulator / SIM_DT
+
+        with profiler.phase("draw"):
+            view = prediction.view(alpha)
+            draw_frame(screen, font, match, view, alpha)
+            for pid, pos in others.items():
+                pygame.draw.circle(screen, (255, 255, 0), world_to_screen(pos["x"], pos["y"], *view), 10)
+            profiler.draw_overlay(screen, font)
+        with profiler.phase("present"):
+            pygame.display.flip()
+        profiler.end_frame()
+    net.close()
+    # end
+    pygame.time.wait(100)
+    screen.fill((10,10,20))
+    msg = f"Game Over - Winner: {match.winner}"
+    screen.blit(font.render(msg, True, (240,240,240)), (WIDTH//2-200, HEIGHT//2-10))
+    pygame.display.flip()
+    pygame.time.wait(4000)
+    pygame.quit()
 
-    minimap_surf.blit(font_small.render(f"R{idx+1}", True, (255,255,255)), (rx_px+2, ry_px+2))
+# ---------- Headless simulation ----------
+class Autopilot:
+    """Scripted stand-in for the human player in headless matches.
 
-# PLAYER
-    px_minimap = player.x * SCALE_X
-    py_minimap = player.y * SCALE_Y
-    pygame.draw.circle(minimap_surf, (50,180,255), (int(px_minimap), int(py_minimap)), 4)
+    Walks toward the nearest live bot and shoots when it has line of sight.
+    """
+    def __init__(self):
+        self.player = None
+        self.path = []
+        self.path_timer = 0
+        self.shoot_cooldown = 0
 
-# BOTS
-    for b in bots:
-        if not b.alive: continue
-        bx_minimap = b.x * SCALE_X
-        by_minimap = b.y * SCALE_Y
-    pygame.draw.circle(minimap_surf, (240,100,100), (int(bx_minimap), int(by_minimap)), 3)
+    def grid_pos(self):
+        return int(self.player.x // CELL_SIZE), int(self.player.y // CELL_SIZE)
 
+    def control(self, match, dt):
+        player = self.player = match.player
+        found = match.crowd.nearest(player.x, player.y, exclude=player)
+        if not player.alive or not found:
+            return 0, 0
+        d, target = found[0]
 
-    screen.blit(minimap_surf, (MINIMAP_X, MINIMAP_Y))
-    pygame.display.flip()
-    net.close()
-# end
-pygame.time.wait(100)
-screen.fill((10,10,20))
-msg = f"Game Over - Winner: {winner}"
-screen.blit(font.render(msg, True, (240,240,240)), (WIDTH//2-200, HEIGHT//2-10))
-pygame.display.flip()
-pygame.time.wait(4000)
-pygame.quit()
-sys.exit()
+        self.shoot_cooldown -= dt
+        if d < 400 and self.shoot_cooldown <= 0 and line_of_sight((player.x, player.y), (target.x, target.y)):
+            match.fire(target.x, target.y)
+            self.shoot_cooldown = 0.35
+
+        self.path_timer -= dt
+        cell = (int(player.x // CELL_SIZE), int(player.y // CELL_SIZE))
+        if self.path_timer <= 0:
+            self.path_timer = 0.5
+            request_route(self, (int(target.x // CELL_SIZE), int(target.y // CELL_SIZE)))
+        while self.path and self.path[0] == cell:
+            self.path.pop(0)
+        if d < 120 or not self.path:
+            return 0, 0
+        tx, ty = cell_center(self.path[0])
+        dx, dy = tx - player.x, ty - player.y
+        return (dx > 2) - (dx < -2), (dy > 2) - (dy < -2)
+
+def run_headless(seed=0, max_ticks=FPS*180, dt=1/FPS, bot_count=BOT_COUNT, record_ticks=True,
+                 cols=COLS, rows=ROWS, chunk=0):
+    """Play one match with no window, audio or network, as fast as possible.
+
+    Same Match/Bot/Bullet/Pickup code as the live game, fixed tick dt,
+    autopilot in place of the human. Returns the result and, if
+    record_ticks, one stats dict per tick.
+    """
+    build_world(seed, cols, rows, chunk)
+    match = Match(bot_count=bot_count)
+    pilot = Autopilot()
+    ticks = []
+    t0 = time.perf_counter()
+    while match.tick < max_ticks:
+        t = time.perf_counter()
+        running = match.step(dt, pilot.control(match, dt))
+        if record_ticks:
+            ticks.append({
+                "tick": match.tick,
+                "ms": (time.perf_counter() - t) * 1000,
+                "bots_alive": sum(1 for b in match.bots if b.alive),
+                "bullets": len(match.bullets),
+                "player_hp": max(0, match.player.health),
+            })
+        if not running:
+            break
+    wall = time.perf_counter() - t0
+    return {
+        "seed": seed,
+        "winner": match.winner or "Timeout",
+        "ticks": match.tick,
+        "sim_seconds": match.tick * dt,
+        "wall_seconds": wall,
+        "ticks_per_second": match.tick / wall if wall else 0.0,
+        "bots_alive": sum(1 for b in match.bots if b.alive),
+        "player_hp": max(0, match.player.health),
+        "tick_stats": ticks,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maze Battle Royale")
+    parser.add_argument("--headless", action="store_true", help="simulate without window, audio or network")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--matches", type=int, default=1)
+    parser.add_argument("--ticks", type=int, default=FPS*180, help="tick limit per match")
+    parser.add_argument("--tick-rate", type=float, default=FPS, help="fixed ticks per simulated second")
+    parser.add_argument("--bots", type=int, default=BOT_COUNT)
+    parser.add_argument("--cols", type=int, default=COLS)
+    parser.add_argument("--rows", type=int, default=ROWS)
+    parser.add_argument("--chunk", type=int, default=0, help="generate the world lazily in chunks of this many cells")
+    parser.add_argument("--out", help="write results as JSON to this file")
+    parser.add_argument("--planner-workers", type=int, default=0, help="plan bot paths on this many worker processes")
+    args = parser.parse_args(argv)
+
+    if not args.headless:
+        run_game()
+        return
+
+    use_planner(args.planner_workers)
+    results = []
+    try:
+        for m in range(args.matches):
+            res = run_headless(args.seed + m, args.ticks, 1 / args.tick_rate, args.bots, record_ticks=bool(args.out),
+                               cols=args.cols, rows=args.rows, chunk=args.chunk)
+            results.append(res)
+            print(f"seed {res['seed']}: winner={res['winner']} ticks={res['ticks']} "
+                  f"{res['ticks_per_second']:.0f} ticks/s")
+    finally:
+        use_planner(0)
+    wins = {}
+    for res in results:
+        wins[res["winner"]] = wins.get(res["winner"], 0) + 1
+    print("winners:", wins)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f)
+
+if __name__ == "__main__":
+    main()
+    sys.exit()
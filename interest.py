@@ -0,0 +1,116 @@
+# interest.py
+"""
+Server-side interest management (area of interest filtering).
+
+Each snapshot, InterestGrid buckets every entity of a match into coarse
+cells over the world (built once per match, shared by all its clients). A
+client's Interest then keeps only the entities within its view radius
+(half the screen diagonal plus a margin) and, when LOS checking is on, only
+those the maze does not hide. Entities beyond near_radius are refreshed only
+every far_every-th snapshot. In between, the client is sent the state it
+already has, which the delta encoder skips for free.
+
+An entity enters the set inside radius and leaves it only beyond radius +
+hysteresis, so anything pacing along the edge does not flicker in and out.
+Enter and leave need no messages of their own: an entity new to the
+filtered state goes out as a full record, and one that dropped out goes out
+as REMOVED.
+"""
+
+import math
+import game, protocol
+
+GRID_CELL = 256
+VIEW_MARGIN = 200
+HYSTERESIS = 120
+FAR_EVERY = 3
+
+def view_radius(margin=VIEW_MARGIN):
+    return math.hypot(game.WIDTH, game.HEIGHT) / 2 + margin
+
+class InterestGrid:
+    """Uniform bucket grid over the world, holding entity ids and their positions."""
+    def __init__(self, cell=GRID_CELL):
+        self.cell = cell
+        self.buckets = {}
+        self.pos = {}
+
+    def rebuild(self, state):
+        """Rebucket a snapshot state ({eid: (xq, yq, flags, hp)})."""
+        self.buckets = buckets = {}
+        self.pos = pos = {}
+        size = self.cell * protocol.QUANT
+        for eid, (xq, yq, _, _) in state.items():
+            pos[eid] = (xq / protocol.QUANT, yq / protocol.QUANT)
+            key = (xq // size, yq // size)
+            b = buckets.get(key)
+            if b is None:
+                buckets[key] = [eid]
+            else:
+                b.append(eid)
+
+    def query(self, x, y, radius):
+        """(eid, squared distance) of every entity within radius of (x, y)."""
+        c = self.cell
+        r2 = radius * radius
+        out = []
+        pos = self.pos
+        for gy in range(int((y - radius) // c), int((y + radius) // c) + 1):
+            for gx in range(int((x - radius) // c), int((x + radius) // c) + 1):
+                for eid in self.buckets.get((gx, gy), ()):
+                    ex, ey = pos[eid]
+                    d2 = (ex - x) ** 2 + (ey - y) ** 2
+                    if d2 <= r2:
+                        out.append((eid, d2))
+        return out
+
+class Interest:
+    """What one client currently knows about, and when each far entity was last refreshed."""
+    def __init__(self, radius=None, near_radius=None, hysteresis=HYSTERESIS, far_every=FAR_EVERY, los=False):
+        self.radius = radius or view_radius()
+        self.near_radius = near_radius or self.radius / 2
+        self.hysteresis = hysteresis
+        self.far_every = far_every
+        self.los = los
+        self.sent = {}           # eid -> state last handed to this client
+        self.refreshed = {}      # eid -> snapshot number of the last refresh
+        self.frame = 0
+        self.entered = 0         # enter / leave counts of the latest filter() call
+        self.left = 0
+
+    def filter(self, viewer, state, grid):
+        """
+        The part of state this client should get, viewed from eid viewer.
+        Always includes the viewer itself; far entities keep their last sent
+        state until they are due again.
+        """
+        self.frame += 1
+        self.entered = self.left = 0
+        me = grid.pos.get(viewer)
+        if me is None:
+            self.left = len(self.sent)
+            self.sent = {}; self.refreshed = {}
+            return {}
+        x, y = me
+        near2 = self.near_radius ** 2
+        enter2 = self.radius ** 2
+        out = {}
+        for eid, d2 in grid.query(x, y, self.radius + self.hysteresis):
+            known = eid in self.sent
+            if not known and d2 > enter2 and eid != viewer:
+                continue
+            if self.los and eid != viewer and not game.line_of_sight(me, grid.pos[eid]):
+                continue
+            if known and d2 > near2 and self.frame - self.refreshed[eid] < self.far_every:
+                out[eid] = self.sent[eid]
+                continue
+            out[eid] = state[eid]
+            self.refreshed[eid] = self.frame
+            if not known:
+                self.entered += 1
+        for eid in self.sent:
+            if eid not in out:
+                self.left += 1
+                del self.refreshed[eid]
+        self.sent = out
+        return out
@@ -0,0 +1,234 @@
+# network_client.py
+"""
+Multiplayer client used by game.py.
+
+All socket I/O runs on a background thread, so a slow or dead server never
+stalls a frame. The game thread and the I/O thread only talk through deques
+(append/popleft are atomic in CPython, no locks involved):
+
+- outbound: numbered movement inputs, batched into one message at most
+  send_rate times a second however fast the game renders;
+- inbound: parsed snapshots, drained by the game thread into a timestamped
+  buffer per remote player;
+- authority: the newest (input ack, x, y) of our own player, for
+  client-side prediction to reconcile against;
+- welcome: the server's map (seed, cols, rows, chunk) and the last input
+  the (re)join position already includes, once per connection.
+
+A (re)join sends the position after the newest input queued so far and
+drops the inputs it includes from the outbound queue, so the server never
+applies an input twice; take_welcome() hands the game thread that input's
+sequence number to rebase its prediction on.
+
+Remote players are drawn interp_delay seconds in the past, interpolated
+between the two snapshots around that time, so jitter and bursts of packets
+do not show up as teleporting players.
+
+Wire format: the binary protocol in protocol.py. Snapshots arrive as deltas
+against the last snapshot this client acknowledged, and every position
+update carries that ack. Remote players are keyed by their entity id.
+"""
+
+import collections, select, socket, threading, time
+import protocol
+
+class NetworkClient:
+    def __init__(self, server_host="127.0.0.1", server_port=5555, client_id=None,
+                 send_rate=20, interp_delay=0.1, buffer_len=32):
+        self.server = (server_host, server_port)
+        self.client_id = client_id
+        self.send_interval = 1.0 / send_rate
+        self.interp_delay = interp_delay
+        self.buffer_len = buffer_len
+
+        self.outbound = collections.deque(maxlen=4096)  # (seq, dx, dy, dt) not sent yet
+        self.inbound = collections.deque(maxlen=256)    # (local_time, snapshot dict)
+        self.authority = collections.deque(maxlen=1)    # latest (input_ack, x, y)
+        self.welcome = collections.deque(maxlen=1)      # latest (join_seq, world)
+        self.position = (0, 0.0, 0.0)                   # (seq, x, y) after the newest input: rejoin position
+        self.join_seq = 0
+        self.entity_id = None
+        self.history = {}            # seq -> decoded state, for delta bases (I/O thread)
+        self.acked = 0
+
+        self.snapshots = {}          # id -> deque of (server_time, x, y)
+        self.clock_offset = None     # local monotonic minus server time
+        self.connected = False
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---------- game thread API ----------
+    def connect(self, start_x=0, start_y=0):
+        """Start the I/O thread; returns immediately, connecting happens in the background."""
+        self.position = (0, start_x, start_y)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="net-io", daemon=True)
+            self._thread.start()
+
+    def send_input(self, seq, dx, dy, dt, pos):
+        """Queue input number seq (applied locally already, leaving the player at pos)."""
+        self.outbound.append((seq, dx, dy, dt))
+        self.position = (seq, pos[0], pos[1])
+
+    def take_authority(self):
+        """The newest authoritative (input_ack, x, y) not taken yet, or None."""
+        try:
+            return self.authority.pop()
+        except IndexError:
+            return None
+
+    def take_welcome(self):
+        """(join_seq, (seed, cols, rows, chunk)) of the newest WELCOME not taken yet, or None."""
+        try:
+            return self.welcome.pop()
+        except IndexError:
+            return None
+
+    def wait_welcome(self, timeout):
+        """take_welcome(), waiting up to timeout seconds for the server to answer."""
+        end = time.monotonic() + timeout
+        while True:
+            welcome = self.take_welcome()
+            if welcome is not None or time.monotonic() >= end:
+                return welcome
+            time.sleep(0.01)
+
+    def get_other_players(self, now=None):
+        """Interpolated {id: {"x", "y"}} of every other player."""
+        self._drain()
+        if self.clock_offset is None:
+            return {}
+        now = time.monotonic() if now is None else now
+        render_t = now - self.clock_offset - self.interp_delay
+        return {pid: self._sample(buf, render_t) for pid, buf in self.snapshots.items() if buf}
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    # ---------- snapshot buffer ----------
+    def _drain(self):
+        while True:
+            try:
+                local_t, snap = self.inbound.popleft()
+            except IndexError:
+                break
+            t = snap.get("t", 0.0)
+            offset = local_t - t
+            # track the fastest-arriving packet, but let the estimate drift up slowly
+            if self.clock_offset is None or offset < self.clock_offset:
+                self.clock_offset = offset
+            else:
+                self.clock_offset += (offset - self.clock_offset) * 0.01
+            players = snap.get("players", {})
+            for pid in list(self.snapshots):
+                if pid not in players:
+                    del self.snapshots[pid]
+            for pid, pos in players.items():
+                if pid == self.entity_id:
+                    continue
+                buf = self.snapshots.get(pid)
+                if buf is None:
+                    buf = self.snapshots[pid] = collections.deque(maxlen=self.buffer_len)
+                if not buf or t > buf[-1][0]:
+                    buf.append((t, pos["x"], pos["y"]))
+
+    @staticmethod
+    def _sample(buf, t):
+        if t <= buf[0][0]:
+            return {"x": buf[0][1], "y": buf[0][2]}
+        if t >= buf[-1][0]:
+            return {"x": buf[-1][1], "y": buf[-1][2]}
+        for (t0, x0, y0), (t1, x1, y1) in zip(buf, list(buf)[1:]):
+            if t0 <= t <= t1:
+                a = (t - t0) / (t1 - t0) if t1 > t0 else 1.0
+                return {"x": x0 + (x1 - x0) * a, "y": y0 + (y1 - y0) * a}
+        return {"x": buf[-1][1], "y": buf[-1][2]}
+
+    # ---------- I/O thread ----------
+    def _run(self):
+        retry = 0.5
+        while not self._stop.is_set():
+            try:
+                sock = socket.create_connection(self.server, timeout=2.0)
+            except OSError:
+                self._stop.wait(retry)
+                retry = min(retry * 2, 5.0)
+                continue
+            retry = 0.5
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setblocking(False)
+            self.connected = True
+            try:
+                self._pump(sock)
+            except OSError:
+                pass
+            finally:
+                self.connected = False
+                sock.close()
+
+    def _pump(self, sock):
+        # (re)joining is the first thing sent on every connection, and the
+        # server starts from a full snapshot again. The join position already
+        # includes every input up to seq, so those must not be sent as well.
+        seq, x, y = self.position
+        while self.outbound and self.outbound[0][0] <= seq:
+            self.outbound.popleft()
+        self.join_seq = seq
+        out = bytearray(protocol.encode_join(self.client_id or "", x, y))
+        frames = protocol.FrameReader()
+        self.history.clear()
+        self.acked = 0
+        next_send = time.monotonic()
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if now >= next_send:
+                next_send = now + self.send_interval
+                inputs = []
+                while self.outbound and len(inputs) < protocol.MAX_INPUTS:
+                    inputs.append(self.outbound.popleft())
+                out += protocol.encode_input(self.acked, inputs)
+
+            readable, writable, _ = select.select([sock], [sock] if out else [], [], max(0.0, next_send - now))
+            if writable:
+                n = sock.send(out)
+                self.bytes_sent += n
+                del out[:n]
+            if readable:
+                data = sock.recv(65536)
+                if not data:
+                    return
+                self.bytes_received += len(data)
+                frames.feed(data)
+                local_t = time.monotonic()
+                for body in frames.frames():
+                    self._handle(body, local_t)
+
+    def _handle(self, body, local_t):
+        try:
+            kind = protocol.message_type(body)
+            if kind == protocol.MSG_WELCOME:
+                self.entity_id, world = protocol.decode_welcome(body)
+                self.welcome.append((self.join_seq, world))
+                return
+            if kind != protocol.MSG_SNAPSHOT:
+                return
+            seq, t, state, own = protocol.decode_snapshot(body, self.history)
+        except protocol.ProtocolError:
+            return
+        self.history[seq] = state
+        self.acked = seq
+        if own[0]:
+            self.authority.append(own)
+        for old in [s for s in self.history if s < seq - 64]:
+            del self.history[old]
+        players = {}
+        for eid, (x, y, flags, hp) in state.items():
+            if protocol.entity_kind(eid) == protocol.KIND_PLAYER:
+                players[eid] = {"x": protocol.dequantize(x), "y": protocol.dequantize(y)}
+        self.inbound.append((local_t, {"t": t, "players": players, "state": state}))
@@ -0,0 +1,146 @@
+# profiler.py
+"""
+Frame profiler for the game loop.
+
+Phases of each frame (events, ai, physics, network, draw, ...) are timed into
+a fixed-size ring buffer together with per-frame counters (A* calls, LOS
+queries, live bullets, draw calls). The overlay shows a stacked frame-time
+graph; dump() writes the buffer as Chrome trace-event JSON (open it in
+chrome://tracing or https://ui.perfetto.dev).
+
+While disabled, phase() hands back a shared no-op context and count() returns
+straight away, so the instrumentation can stay in the hot loop.
+"""
+
+import json, time
+import pygame
+
+PHASE_COLORS = {
+    "events":  (120, 120, 140),
+    "ai":      (240, 100, 100),
+    "physics": (250, 200, 80),
+    "network": (90, 200, 250),
+    "draw":    (120, 220, 120),
+    "present": (180, 120, 240),
+}
+OTHER_COLOR = (200, 200, 200)
+
+class _NullPhase:
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+_NULL_PHASE = _NullPhase()
+
+class _Phase:
+    __slots__ = ("prof", "name", "start")
+    def __init__(self, prof, name):
+        self.prof = prof; self.name = name
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    def __exit__(self, *exc):
+        self.prof.spans.append((self.name, self.start, time.perf_counter() - self.start))
+        return False
+
+class FrameProfiler:
+    def __init__(self, frames=240, budget_ms=1000 / 60):
+        self.enabled = False
+        self.size = frames
+        self.budget_ms = budget_ms
+        self.ring = [None] * frames
+        self.next = 0
+        self.spans = []
+        self.counters = {}
+        self.frame_start = 0.0
+        self.graph = None
+        self.origin = time.perf_counter()
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.spans = []; self.counters = {}
+        self.frame_start = time.perf_counter()
+
+    # ---------- recording ----------
+    def begin_frame(self):
+        if self.enabled:
+            self.frame_start = time.perf_counter()
+            self.spans = []
+            self.counters = {}
+
+    def phase(self, name):
+        return _Phase(self, name) if self.enabled else _NULL_PHASE
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        if self.enabled:
+            self.counters[name] = value
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        frame = (self.frame_start, time.perf_counter() - self.frame_start, self.spans, self.counters)
+        self.ring[self.next] = frame
+        self.next = (self.next + 1) % self.size
+        self._plot(frame)
+
+    def frames(self):
+        """Recorded frames, oldest first: (start, duration, spans, counters)."""
+        return [f for f in self.ring[self.next:] + self.ring[:self.next] if f is not None]
+
+    # ---------- overlay ----------
+    def _plot(self, frame):
+        # the graph scrolls one pixel per frame, so only the new column is drawn
+        h = 100
+        if self.graph is None:
+            self.graph = pygame.Surface((self.size, h))
+            self.graph.fill((0, 0, 0))
+        g = self.graph
+        g.scroll(-1, 0)
+        g.fill((0, 0, 0), (self.size - 1, 0, 1, h))
+        px_per_ms = h / (self.budget_ms * 2)
+        y = h
+        for name, _, dur in frame[2]:
+            bar = max(1, int(dur * 1000 * px_per_ms))
+            g.fill(PHASE_COLORS.get(name, OTHER_COLOR), (self.size - 1, y - bar, 1, bar))
+            y -= bar
+            if y <= 0:
+                break
+        budget_y = h - int(self.budget_ms * px_per_ms)
+        g.set_at((self.size - 1, budget_y), (255, 255, 255))
+
+    def draw_overlay(self, surf, font, pos=None):
+        if not self.enabled or self.graph is None:
+            return
+        x, y = pos or (8, surf.get_height() - self.graph.get_height() - 60)
+        surf.blit(self.graph, (x, y))
+        last = self.ring[(self.next - 1) % self.size]
+        if last is None:
+            return
+        ty = y + self.graph.get_height() + 2
+        lines = [f"frame {last[1]*1000:5.2f} ms  " + "  ".join(f"{n} {d*1000:.2f}" for n, _, d in last[2])]
+        lines.append("  ".join(f"{k}: {v}" for k, v in sorted(last[3].items())))
+        lines.append("F3 overlay  F4 dump trace")
+        for line in lines:
+            surf.blit(font.render(line, True, (230, 230, 230)), (x, ty))
+            ty += 18
+
+    # ---------- export ----------
+    def chrome_trace(self):
+        events = []
+        us = lambda t: (t - self.origin) * 1e6
+        for start, dur, spans, counters in self.frames():
+            events.append({"name": "frame", "ph": "X", "ts": us(start), "dur": dur * 1e6, "pid": 1, "tid": 1})
+            for name, s, d in spans:
+                events.append({"name": name, "ph": "X", "ts": us(s), "dur": d * 1e6, "pid": 1, "tid": 2})
+            if counters:
+                events.append({"name": "counters", "ph": "C", "ts": us(start), "pid": 1, "args": dict(counters)})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, path=None):
+        path = path or time.strftime("trace-%Y%m%d-%H%M%S.json")
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+        return path
@@ -0,0 +1,298 @@
+# protocol.py
+"""
+Binary wire format shared by server.py and network_client.py.
+
+Every message is a frame: a little-endian u16 length followed by the body.
+Each body starts with (version u8, type u8).
+
+    client -> server
+      JOIN      name (u8 length + utf-8), x f64, y f64
+      INPUT     ack u32, first input seq u32, count u8, then count inputs
+                of (move u8, dt u16 in 0.1 ms); move packs dx+1 and dy+1 in two bits each
+      FIRE      x u32q, y u32q
+    server -> client
+      WELCOME   entity id u16, then the map: seed u32, cols u16, rows u16,
+                chunk u16 (0 for a flat world), as passed to game.build_world
+      SNAPSHOT  seq u32, base u32, input ack u32, own x f64, own y f64,
+                time f64, count u16, then count entity records
+
+The input ack is the last input of this client the server has applied, and
+own x/y is exactly where that left the client's player, so client-side
+prediction replays from the same floats the server has.
+
+Positions are quantized to 1/QUANT of a pixel into a u32, which covers any
+world game.build_world can make (65535 cells of 40 px is about 2.6M px). An entity id carries its kind in the top two bits
+(eid = kind << 14 | index). An entity's state is (x, y, flags, hp), where
+flags packs alive / aux bits; aux is "fired by a player" for bullets and
+"ammo" for pickups.
+
+A snapshot is a delta against the base snapshot the client last acknowledged
+(base 0 means full state). Only changed entities are written: id u16, a
+change mask u8, then the fields named in the mask. A small move becomes two
+i8s, and an entity missing from the new state is sent as REMOVED.
+
+The Encoder keeps one preallocated buffer and writes into it with
+struct.pack_into, so steady-state encoding allocates nothing beyond the
+returned memoryview slice. The fuzz / round-trip tests are in
+tests/test_protocol.py.
+"""
+
+import struct
+
+VERSION = 5
+QUANT = 4
+MAX_COORD = 0xFFFFFFFF
+
+MSG_JOIN, MSG_INPUT, MSG_FIRE, MSG_WELCOME, MSG_SNAPSHOT = 1, 2, 3, 4, 5
+
+KIND_PLAYER, KIND_BOT, KIND_BULLET, KIND_PICKUP = 0, 1, 2, 3
+KIND_SHIFT = 14
+INDEX_MASK = (1 << KIND_SHIFT) - 1
+
+FLAG_ALIVE = 1
+FLAG_AUX = 2
+
+CH_POS = 1          # absolute x, y
+CH_DPOS = 2         # x, y as i8 deltas against the base
+CH_FLAGS = 4
+CH_HP = 8
+CH_REMOVED = 128
+
+FRAME = struct.Struct("<H")
+HEADER = struct.Struct("<BB")
+JOIN = struct.Struct("<dd")
+INPUT_HEAD = struct.Struct("<BBIIB")
+INPUT = struct.Struct("<BH")
+INPUT_DT_UNIT = 10000        # dt travels in tenths of a millisecond
+MAX_INPUTS = 255
+FIRE = struct.Struct("<BBII")
+WELCOME = struct.Struct("<BBHIHHH")
+SNAP_HEAD = struct.Struct("<BBIIIdddH")
+REC_HEAD = struct.Struct("<HB")
+POS = struct.Struct("<II")
+DPOS = struct.Struct("<bb")
+BYTE = struct.Struct("<B")
+
+MAX_FRAME = 0xFFFF
+
+class ProtocolError(ValueError):
+    pass
+
+def quantize(v):
+    return min(MAX_COORD, max(0, int(round(v * QUANT))))
+
+def dequantize(q):
+    return q / QUANT
+
+def entity_id(kind, index):
+    return kind << KIND_SHIFT | (index & INDEX_MASK)
+
+def entity_kind(eid):
+    return eid >> KIND_SHIFT
+
+def entity_state(x, y, alive=True, aux=False, hp=0):
+    """Quantized wire state of one entity: (xq, yq, flags, hp)."""
+    flags = (FLAG_ALIVE if alive else 0) | (FLAG_AUX if aux else 0)
+    return (quantize(x), quantize(y), flags, min(255, max(0, int(hp))))
+
+# ---------- framing ----------
+class FrameReader:
+    """Reassembles length-prefixed frames from a byte stream."""
+    def __init__(self):
+        self.buf = bytearray()
+
+    def feed(self, data):
+        self.buf += data
+
+    def frames(self):
+        """Yield complete frame bodies as bytes, keeping any partial tail."""
+        buf = self.buf
+        pos = 0
+        while len(buf) - pos >= 2:
+            (n,) = FRAME.unpack_from(buf, pos)
+            if len(buf) - pos - 2 < n:
+                break
+            yield bytes(buf[pos + 2:pos + 2 + n])
+            pos += 2 + n
+        if pos:
+            del buf[:pos]
+
+def message_type(body):
+    if len(body) < 2:
+        raise ProtocolError("short message")
+    version, kind = HEADER.unpack_from(body, 0)
+    if version != VERSION:
+        raise ProtocolError(f"unsupported protocol version {version}")
+    return kind
+
+# ---------- small messages ----------
+def encode_join(name, x, y):
+    raw = str(name).encode("utf-8")[:255]
+    body = HEADER.pack(VERSION, MSG_JOIN) + BYTE.pack(len(raw)) + raw + JOIN.pack(x, y)
+    return FRAME.pack(len(body)) + body
+
+def decode_join(body):
+    try:
+        (n,) = BYTE.unpack_from(body, 2)
+        name = bytes(body[3:3 + n]).decode("utf-8")
+        x, y = JOIN.unpack_from(body, 3 + n)
+    except (struct.error, UnicodeDecodeError) as e:
+        raise ProtocolError(f"bad join: {e}") from None
+    return name, x, y
+
+def input_dt(dt):
+    """dt as it travels in an INPUT (0.1 ms steps, at least one, at most ~6.5 s)."""
+    return min(0xFFFF, max(1, int(round(dt * INPUT_DT_UNIT)))) / INPUT_DT_UNIT
+
+def encode_input(ack, inputs):
+    """inputs: consecutive (seq, dx, dy, dt), at most MAX_INPUTS of them, dx/dy in -1..1."""
+    n = len(inputs)
+    first = inputs[0][0] if inputs else 0
+    body = bytearray(INPUT_HEAD.size + INPUT.size * n)
+    INPUT_HEAD.pack_into(body, 0, VERSION, MSG_INPUT, ack, first, n)
+    pos = INPUT_HEAD.size
+    for _, dx, dy, dt in inputs:
+        INPUT.pack_into(body, pos, (dx + 1) | (dy + 1) << 2, int(round(input_dt(dt) * INPUT_DT_UNIT)))
+        pos += INPUT.size
+    return FRAME.pack(len(body)) + bytes(body)
+
+def decode_input(body):
+    """(ack, [(seq, dx, dy, dt), ...])"""
+    try:
+        _, _, ack, seq, n = INPUT_HEAD.unpack_from(body, 0)
+        inputs = []
+        pos = INPUT_HEAD.size
+        for i in range(n):
+            move, units = INPUT.unpack_from(body, pos); pos += INPUT.size
+            dx, dy = (move & 3) - 1, (move >> 2 & 3) - 1
+            if dx > 1 or dy > 1 or not units:
+                raise ProtocolError("bad input value")
+            inputs.append((seq + i, dx, dy, units / INPUT_DT_UNIT))
+    except struct.error as e:
+        raise ProtocolError(f"bad input: {e}") from None
+    return ack, inputs
+
+def encode_fire(x, y):
+    return FRAME.pack(FIRE.size) + FIRE.pack(VERSION, MSG_FIRE, quantize(x), quantize(y))
+
+def decode_fire(body):
+    try:
+        _, _, xq, yq = FIRE.unpack_from(body, 0)
+    except struct.error as e:
+        raise ProtocolError(f"bad fire: {e}") from None
+    return dequantize(xq), dequantize(yq)
+
+def encode_welcome(eid, world):
+    """world: (seed, cols, rows, chunk) of the server's map."""
+    return FRAME.pack(WELCOME.size) + WELCOME.pack(VERSION, MSG_WELCOME, eid, *world)
+
+def decode_welcome(body):
+    """(eid, (seed, cols, rows, chunk))"""
+    try:
+        _, _, eid, seed, cols, rows, chunk = WELCOME.unpack_from(body, 0)
+    except struct.error as e:
+        raise ProtocolError(f"bad welcome: {e}") from None
+    return eid, (seed, cols, rows, chunk)
+
+# ---------- snapshots ----------
+class Encoder:
+    """Delta-encodes snapshots into one reused buffer."""
+    def __init__(self, size=MAX_FRAME + 2):
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+
+    def snapshot(self, seq, t, state, base_seq=0, base=None, input_ack=0, own=(0.0, 0.0)):
+        """
+        Encode state ({eid: (xq, yq, flags, hp)}) as a frame, delta against base.
+        Returns a memoryview into the shared buffer, valid until the next call.
+        """
+        base = base or {}
+        buf = self.buf
+        pos = 2 + SNAP_HEAD.size
+        count = 0
+        limit = len(buf) - 16
+        for eid, cur in state.items():
+            old = base.get(eid)
+            if old == cur:
+                continue
+            if pos > limit:
+                raise ProtocolError("snapshot too large for one frame")
+            x, y, flags, hp = cur
+            start = pos
+            pos += REC_HEAD.size
+            mask = 0
+            if old is None:
+                mask = CH_POS | CH_FLAGS | CH_HP
+                POS.pack_into(buf, pos, x, y); pos += POS.size
+                BYTE.pack_into(buf, pos, flags); pos += 1
+                BYTE.pack_into(buf, pos, hp); pos += 1
+            else:
+                ox, oy, oflags, ohp = old
+                dx, dy = x - ox, y - oy
+                if dx or dy:
+                    if -128 <= dx <= 127 and -128 <= dy <= 127:
+                        mask |= CH_DPOS
+                        DPOS.pack_into(buf, pos, dx, dy); pos += 2
+                    else:
+                        mask |= CH_POS
+                        POS.pack_into(buf, pos, x, y); pos += POS.size
+                if flags != oflags:
+                    mask |= CH_FLAGS
+                    BYTE.pack_into(buf, pos, flags); pos += 1
+                if hp != ohp:
+                    mask |= CH_HP
+                    BYTE.pack_into(buf, pos, hp); pos += 1
+            REC_HEAD.pack_into(buf, start, eid, mask)
+            count += 1
+        for eid in base:
+            if eid not in state:
+                if pos > limit:
+                    raise ProtocolError("snapshot too large for one frame")
+                REC_HEAD.pack_into(buf, pos, eid, CH_REMOVED); pos += REC_HEAD.size
+                count += 1
+        SNAP_HEAD.pack_into(buf, 2, VERSION, MSG_SNAPSHOT, seq, base_seq if base else 0,
+                            input_ack, own[0], own[1], t, count)
+        FRAME.pack_into(buf, 0, pos - 2)
+        return self.view[:pos]
+
+def decode_snapshot(body, history):
+    """
+    Decode a snapshot body against history ({seq: state}, as kept by the
+    receiver). Returns (seq, t, state, (input_ack, own_x, own_y)); the state
+    is a new dict.
+    """
+    try:
+        _, _, seq, base_seq, input_ack, own_x, own_y, t, count = SNAP_HEAD.unpack_from(body, 0)
+        if base_seq:
+            if base_seq not in history:
+                raise ProtocolError(f"unknown base snapshot {base_seq}")
+            state = dict(history[base_seq])
+        else:
+            state = {}
+        pos = SNAP_HEAD.size
+        for _ in range(count):
+            eid, mask = REC_HEAD.unpack_from(body, pos); pos += REC_HEAD.size
+            if mask & CH_REMOVED:
+                state.pop(eid, None)
+                continue
+            old = state.get(eid)
+            if old is None and mask & (CH_POS | CH_FLAGS | CH_HP) != (CH_POS | CH_FLAGS | CH_HP):
+                raise ProtocolError(f"partial record for unknown entity {eid}")
+            x, y, flags, hp = old or (0, 0, 0, 0)
+            if mask & CH_POS:
+                x, y = POS.unpack_from(body, pos); pos += POS.size
+            elif mask & CH_DPOS:
+                dx, dy = DPOS.unpack_from(body, pos); pos += 2
+                x += dx; y += dy
+                if not (0 <= x <= MAX_COORD and 0 <= y <= MAX_COORD):
+                    raise ProtocolError(f"delta moves entity {eid} out of range")
+            if mask & CH_FLAGS:
+                (flags,) = BYTE.unpack_from(body, pos); pos += 1
+            if mask & CH_HP:
+                (hp,) = BYTE.unpack_from(body, pos); pos += 1
+            state[eid] = (x, y, flags, hp)
+    except struct.error as e:
+        raise ProtocolError(f"truncated snapshot: {e}") from None
+    if pos != len(body):
+        raise ProtocolError("trailing bytes after snapshot")
+    return seq, t, state, (input_ack, own_x, own_y)
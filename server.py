@@ -0,0 +1,456 @@
+# server.py
+"""
+Authoritative game server: many independent matches in one asyncio process.
+
+Every match is a game.Match (bots, bullets, pickups) stepped at its own fixed
+tick rate. A single earliest-deadline-first scheduler task runs all match
+ticks and yields to the event loop between them, so client I/O keeps flowing
+under load; a match that falls more than MAX_CATCHUP ticks behind drops the
+backlog instead of snowballing. All matches share the map built at startup,
+and WELCOME tells each client how to build the same one (seed, size, chunk).
+
+The first client in a match controls its player (until then an autopilot
+plays it); later clients are guests. Players move only by the numbered
+inputs their clients send, applied with the same Player.move the clients
+predict with, and each snapshot tells a client which of its inputs it
+reflects. Clients
+speak the binary protocol in protocol.py: each client gets snapshots
+delta-encoded against the last one it acknowledged, filtered down to its
+area of interest (interest.py) unless --no-interest is given.
+
+    python server.py --port 5555 --matches 4
+    python server.py --loopback --matches 50 --clients 100 --duration 10
+
+Metrics (ticks, overruns, scheduling lag, busy time and the resulting
+matches-per-core estimate) are printed every --report seconds.
+"""
+
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse, asyncio, collections, heapq, json, random, time, uuid
+import game, interest, protocol
+
+MAX_CATCHUP = 3
+SNAPSHOT_RATE = 20
+PLAYERS_PER_MATCH = 4
+HISTORY = 64                 # unacked snapshots kept per client before falling back to full state
+MAX_INPUTS_PER_TICK = 8      # inputs applied per client per tick; the rest wait for the next one
+MAX_INPUT_DT = 3 * game.SIM_DT   # s; a longer input could step a player through a wall, so it is dropped
+INPUT_BURST = 0.25           # s of input time a client may bank while its packets are late
+INPUT_TIME_SLACK = 1.05      # input time allowed per second of server time (dt is rounded, clocks drift)
+MAX_PENDING_INPUTS = 120     # queued inputs per client; newer ones are dropped until the queue drains
+
+class ServerMatch:
+    def __init__(self, match_id, tick_rate, bot_count):
+        self.id = match_id
+        self.tick_rate = tick_rate
+        self.dt = 1.0 / tick_rate
+        self.bot_count = bot_count
+        self.clients = {}            # client id -> ClientConn
+        self.host = None             # client id controlling match.player
+        self.guests = {}             # client id -> game.Player
+        self.slots = {}              # client id -> player entity index
+        self.grid = interest.InterestGrid()
+        self.reset()
+
+        self.ticks = 0
+        self.overruns = 0
+        self.busy = 0.0
+        self.max_lag = 0.0
+        self.next_snapshot = 0.0
+
+    def reset(self):
+        self.match = game.Match(bot_count=self.bot_count)
+        self.pilot = game.Autopilot()
+        self.move = (0, 0)
+        self.time = 0.0
+
+    def join(self, conn, x, y):
+        self.clients[conn.id] = conn
+        if self.host is None:
+            self.host = conn.id
+            self.match.player.x, self.match.player.y = float(x), float(y)
+            self.slots[conn.id] = 0
+        else:
+            self.guests[conn.id] = game.Player(x, y)
+            used = set(self.slots.values())
+            self.slots[conn.id] = next(i for i in range(1, len(used) + 2) if i not in used)
+        return protocol.entity_id(protocol.KIND_PLAYER, self.slots[conn.id])
+
+    def leave(self, conn):
+        self.clients.pop(conn.id, None)
+        self.guests.pop(conn.id, None)
+        self.slots.pop(conn.id, None)
+        if self.host == conn.id:
+            self.host = None
+
+    def player_of(self, conn):
+        return self.match.player if conn.id == self.host else self.guests.get(conn.id)
+
+    def on_message(self, conn, kind, body):
+        if kind == protocol.MSG_INPUT:
+            conn.acked, inputs = protocol.decode_input(body)
+            last = conn.inputs[-1][0] if conn.inputs else conn.input_ack
+            fresh = [i for i in inputs if i[0] > last]
+            room = MAX_PENDING_INPUTS - len(conn.inputs)
+            conn.rejected_inputs += max(0, len(fresh) - room)
+            conn.inputs.extend(fresh[:max(0, room)])
+        elif kind == protocol.MSG_FIRE and conn.id == self.host:
+            self.match.fire(*protocol.decode_fire(body))
+
+    def apply_inputs(self):
+        """Apply queued inputs, at most as much input time as server time has passed.
+
+        Each client banks about self.dt of input time per tick (up to INPUT_BURST,
+        so late packets can catch up); an input that does not fit waits for
+        the next tick. Inputs longer than MAX_INPUT_DT are acknowledged but
+        never applied, so a modified client cannot outrun the server or
+        step through walls; its prediction is simply corrected.
+        """
+        for conn in self.clients.values():
+            p = self.player_of(conn)
+            conn.input_budget = min(conn.input_budget + self.dt * INPUT_TIME_SLACK, INPUT_BURST)
+            for _ in range(min(len(conn.inputs), MAX_INPUTS_PER_TICK)):
+                seq, dx, dy, dt = conn.inputs[0]
+                if dt > MAX_INPUT_DT:
+                    conn.rejected_inputs += 1
+                elif dt > conn.input_budget:
+                    break
+                else:
+                    conn.input_budget -= dt
+                    if p is not None:
+                        p.move(dx, dy, dt)
+                conn.inputs.popleft()
+                conn.input_ack = seq
+
+    def step(self):
+        self.apply_inputs()
+        if self.host is None:
+            self.move = self.pilot.control(self.match, self.dt)
+        else:
+            self.move = (0, 0)   # the host moved by its inputs already
+        running = self.match.step(self.dt, self.move)
+        if isinstance(game.maze, game.ChunkedMaze) and self.guests and self.ticks % game.CHUNK_KEEP_EVERY == 0:
+            # guests are not part of the Match, so it does not keep their chunks resident
+            game.maze.keep_near(self, [(p.x, p.y) for p in self.guests.values()])
+        self.time += self.dt
+        self.ticks += 1
+        if not running:
+            self.reset()
+
+    def snapshot(self):
+        """Quantized state of every entity, {eid: (xq, yq, flags, hp)}."""
+        m = self.match
+        eid, es = protocol.entity_id, protocol.entity_state
+        state = {eid(protocol.KIND_PLAYER, 0): es(m.player.x, m.player.y, m.player.alive, hp=m.player.health)}
+        for cid, p in self.guests.items():
+            state[eid(protocol.KIND_PLAYER, self.slots[cid])] = es(p.x, p.y, p.alive, hp=p.health)
+        for i, b in enumerate(m.bots):
+            state[eid(protocol.KIND_BOT, i)] = es(b.x, b.y, b.alive, hp=b.health)
+        # bullets and pickups come and go, so they are keyed by their own ids, not list positions
+        for bid, (x, y, mine) in zip(m.bullets.ids(), m.bullets.positions()):
+            state[eid(protocol.KIND_BULLET, bid)] = es(x, y, True, mine)
+        for p in m.pickups:
+            state[eid(protocol.KIND_PICKUP, p.id)] = es(p.x, p.y, True, p.typ == "ammo")
+        return state
+
+class ClientConn:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.id = None
+        self.eid = None
+        self.match = None
+        self.interest = None
+        self.bytes_out = 0
+        self.seq = 0
+        self.acked = 0
+        self.history = {}            # seq -> state sent, until acked
+        self.inputs = collections.deque()   # (seq, dx, dy, dt) not applied yet
+        self.input_ack = 0
+        self.input_budget = 0.0      # s of input time this client may still apply
+        self.rejected_inputs = 0
+
+    def send(self, data):
+        self.bytes_out += len(data)
+        self.writer.write(data)
+
+    def send_snapshot(self, encoder, t, state):
+        base = self.history.get(self.acked)
+        p = self.match.player_of(self)
+        own = (p.x, p.y) if p is not None else (0.0, 0.0)
+        frame = encoder.snapshot(self.seq + 1, t, state, self.acked if base is not None else 0, base,
+                                 self.input_ack, own)
+        self.seq += 1
+        # the transport may hold on to what it is given; the encoder buffer is reused
+        self.send(bytes(frame))
+        self.history[self.seq] = state
+        for old in [s for s in self.history if s < self.acked or s <= self.seq - HISTORY]:
+            del self.history[old]
+
+class GameServer:
+    def __init__(self, tick_rate=game.FPS, bot_count=game.BOT_COUNT, players_per_match=PLAYERS_PER_MATCH,
+                 aoi=True, los=False, world=(0, game.COLS, game.ROWS, 0)):
+        self.tick_rate = tick_rate
+        self.world = world           # (seed, cols, rows, chunk) of the shared map, told to every client
+        self.bot_count = bot_count
+        self.players_per_match = players_per_match
+        self.aoi = aoi
+        self.los = los
+        self.aoi_stats = {"total": 0, "sent": 0, "entered": 0, "left": 0}
+        self.snapshots_dropped = 0   # snapshots that did not fit in a frame and were not sent
+        self.matches = {}
+        self.schedule = []           # heap of (deadline, seq, match id)
+        self.seq = 0
+        self.wakeup = asyncio.Event()
+        self.encoder = protocol.Encoder()
+        self.started = time.perf_counter()
+
+    # ---------- matches ----------
+    def add_match(self):
+        mid = f"m{len(self.matches) + 1}"
+        sm = ServerMatch(mid, self.tick_rate, self.bot_count)
+        self.matches[mid] = sm
+        self._push(time.perf_counter(), sm)
+        self.wakeup.set()
+        return sm
+
+    def _push(self, deadline, sm):
+        self.seq += 1
+        heapq.heappush(self.schedule, (deadline, self.seq, sm.id))
+
+    def find_match(self):
+        for sm in self.matches.values():
+            if len(sm.clients) < self.players_per_match:
+                return sm
+        return self.add_match()
+
+    async def run_scheduler(self):
+        while True:
+            if not self.schedule:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            deadline, _, mid = self.schedule[0]
+            now = time.perf_counter()
+            if deadline > now:
+                await asyncio.sleep(deadline - now)
+                continue
+            heapq.heappop(self.schedule)
+            sm = self.matches[mid]
+            lag = now - deadline
+            sm.max_lag = max(sm.max_lag, lag)
+            if lag > sm.dt:
+                sm.overruns += 1
+            if lag > sm.dt * MAX_CATCHUP:
+                deadline = now      # drop the backlog rather than spiral
+            t = time.perf_counter()
+            sm.step()
+            if sm.time >= sm.next_snapshot and sm.clients:
+                sm.next_snapshot = sm.time + 1.0 / SNAPSHOT_RATE
+                state = sm.snapshot()
+                if self.aoi:
+                    sm.grid.rebuild(state)
+                for conn in list(sm.clients.values()):
+                    self.send_state(conn, sm, state)
+            sm.busy += time.perf_counter() - t
+            self._push(deadline + sm.dt, sm)
+            await asyncio.sleep(0)
+
+    def send_state(self, conn, sm, state):
+        view = state
+        if conn.interest is not None:
+            view = conn.interest.filter(conn.eid, state, sm.grid)
+            st = self.aoi_stats
+            st["total"] += len(state); st["sent"] += len(view)
+            st["entered"] += conn.interest.entered; st["left"] += conn.interest.left
+        try:
+            conn.send_snapshot(self.encoder, sm.time, view)
+        except protocol.ProtocolError as e:
+            # one oversized view must not stop the scheduler for every match;
+            # this client misses the snapshot and deltas against its last ack next time
+            if not self.snapshots_dropped:
+                print(f"match {sm.id} client {conn.id}: snapshot of {len(view)} entities dropped: {e}",
+                      flush=True)
+            self.snapshots_dropped += 1
+
+    # ---------- clients ----------
+    async def handle_client(self, reader, writer):
+        conn = ClientConn(reader, writer)
+        try:
+            while True:
+                (n,) = protocol.FRAME.unpack(await reader.readexactly(2))
+                body = await reader.readexactly(n)
+                try:
+                    kind = protocol.message_type(body)
+                    if kind == protocol.MSG_JOIN and conn.match is None:
+                        name, x, y = protocol.decode_join(body)
+                        conn.id = name or uuid.uuid4().hex[:8]
+                        conn.match = self.find_match()
+                        conn.eid = conn.match.join(conn, x, y)
+                        if self.aoi:
+                            conn.interest = interest.Interest(los=self.los)
+                        conn.send(protocol.encode_welcome(conn.eid, self.world))
+                    elif conn.match is not None:
+                        conn.match.on_message(conn, kind, body)
+                except protocol.ProtocolError:
+                    continue
+                if writer.transport.get_write_buffer_size() > 1 << 20:
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if conn.match is not None:
+                conn.match.leave(conn)
+            writer.close()
+
+    # ---------- metrics ----------
+    def metrics(self):
+        elapsed = time.perf_counter() - self.started
+        busy = sum(sm.busy for sm in self.matches.values())
+        ticks = sum(sm.ticks for sm in self.matches.values())
+        load = busy / elapsed if elapsed else 0.0
+        return {
+            "elapsed": elapsed,
+            "matches": len(self.matches),
+            "clients": sum(len(sm.clients) for sm in self.matches.values()),
+            "ticks": ticks,
+            "ms_per_tick": busy / ticks * 1000 if ticks else 0.0,
+            "core_load": load,
+            "matches_per_core": len(self.matches) / load if load else 0.0,
+            "overruns": sum(sm.overruns for sm in self.matches.values()),
+            "overrun_rate": sum(sm.overruns for sm in self.matches.values()) / ticks if ticks else 0.0,
+            "max_lag_ms": max((sm.max_lag for sm in self.matches.values()), default=0.0) * 1000,
+            "aoi_sent_ratio": self.aoi_stats["sent"] / self.aoi_stats["total"] if self.aoi_stats["total"] else 1.0,
+            "aoi_entered": self.aoi_stats["entered"],
+            "aoi_left": self.aoi_stats["left"],
+            "snapshots_dropped": self.snapshots_dropped,
+            "inputs_rejected": sum(c.rejected_inputs for sm in self.matches.values() for c in sm.clients.values()),
+            "planner": game.planner.metrics() if game.planner is not None else None,
+        }
+
+    async def report(self, every):
+        while True:
+            await asyncio.sleep(every)
+            m = self.metrics()
+            print(f"[{m['elapsed']:6.1f}s] matches={m['matches']} clients={m['clients']} "
+                  f"ms/tick={m['ms_per_tick']:.3f} load={m['core_load']:.0%} "
+                  f"matches/core={m['matches_per_core']:.1f} overruns={m['overruns']} "
+                  f"max_lag={m['max_lag_ms']:.1f}ms", flush=True)
+
+# ---------- loopback harness ----------
+async def simulated_client(host, port, duration, stats, rng):
+    """
+    A fake player: joins, wanders with 60 Hz inputs sent in 20 Hz batches,
+    predicts its own movement like the real client and counts snapshot
+    traffic and prediction corrections.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    x, y = game.cell_center(game.random_open_cell())
+    writer.write(protocol.encode_join(uuid.uuid4().hex[:8], x, y))
+    prediction = game.Prediction(game.Player(x, y))
+    history = {}
+    acked = 0
+
+    async def read():
+        nonlocal acked
+        while True:
+            try:
+                (n,) = protocol.FRAME.unpack(await reader.readexactly(2))
+                body = await reader.readexactly(n)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                return
+            stats["bytes_in"] += n + 2
+            if protocol.message_type(body) == protocol.MSG_SNAPSHOT:
+                seq, _, history[seq], own = protocol.decode_snapshot(body, history)
+                acked = seq
+                history.pop(seq - HISTORY, None)
+                stats["snapshots"] += 1
+                if own[0]:
+                    prediction.reconcile(*own)
+
+    reading = asyncio.ensure_future(read())
+    end = time.perf_counter() + duration
+    dx = dy = 0
+    while time.perf_counter() < end:
+        if rng.random() < 0.1:
+            dx, dy = rng.randint(-1, 1), rng.randint(-1, 1)
+        batch = []
+        for _ in range(3):
+            seq, dt = prediction.apply(dx, dy, 1 / 60)
+            batch.append((seq, dx, dy, dt))
+        writer.write(protocol.encode_input(acked, batch))
+        await asyncio.sleep(0.05)
+    reading.cancel()
+    writer.close()
+    stats["corrections"] += prediction.corrections
+
+async def loopback(args):
+    server = GameServer(args.tick_rate, args.bots, args.players_per_match, not args.no_interest, args.los,
+                        (args.seed, args.cols, args.rows, args.chunk))
+    for _ in range(args.matches):
+        server.add_match()
+    srv = await asyncio.start_server(server.handle_client, "127.0.0.1", 0)
+    port = srv.sockets[0].getsockname()[1]
+    tasks = [asyncio.ensure_future(server.run_scheduler()), asyncio.ensure_future(server.report(args.report))]
+    stats = {"snapshots": 0, "bytes_in": 0, "corrections": 0}
+    rng = random.Random(args.seed)
+    await asyncio.gather(*(simulated_client("127.0.0.1", port, args.duration, stats, rng) for _ in range(args.clients)))
+    for t in tasks:
+        t.cancel()
+    srv.close()
+    m = server.metrics()
+    m["client_snapshots"] = stats["snapshots"]
+    m["prediction_corrections"] = stats["corrections"]
+    m["bytes_per_client_per_s"] = stats["bytes_in"] / max(1, args.clients) / args.duration
+    print(json.dumps(m, indent=1))
+    return m
+
+async def serve(args):
+    server = GameServer(args.tick_rate, args.bots, args.players_per_match, not args.no_interest, args.los,
+                        (args.seed, args.cols, args.rows, args.chunk))
+    for _ in range(args.matches):
+        server.add_match()
+    srv = await asyncio.start_server(server.handle_client, args.host, args.port)
+    print(f"listening on {args.host}:{args.port}", flush=True)
+    async with srv:
+        await asyncio.gather(srv.serve_forever(), server.run_scheduler(), server.report(args.report))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maze Battle Royale server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--seed", type=int, default=0, help="map seed shared by every match")
+    parser.add_argument("--cols", type=int, default=game.COLS)
+    parser.add_argument("--rows", type=int, default=game.ROWS)
+    parser.add_argument("--chunk", type=int, default=0, help="generate the world lazily in chunks of this many cells")
+    parser.add_argument("--matches", type=int, default=0, help="matches to start before anyone joins")
+    parser.add_argument("--tick-rate", type=float, default=game.FPS)
+    parser.add_argument("--bots", type=int, default=game.BOT_COUNT)
+    parser.add_argument("--players-per-match", type=int, default=PLAYERS_PER_MATCH)
+    parser.add_argument("--no-interest", action="store_true", help="send every client the whole match")
+    parser.add_argument("--los", action="store_true", help="also hide entities the maze blocks from view")
+    parser.add_argument("--report", type=float, default=5.0, help="seconds between metric lines")
+    parser.add_argument("--loopback", action="store_true", help="run simulated clients against an in-process server")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--planner-workers", type=int, default=0, help="plan bot paths on this many worker processes")
+    args = parser.parse_args(argv)
+    # clients rebuild the same map from WELCOME, which carries these as u32 / u16
+    if not 0 <= args.seed <= 0xFFFFFFFF:
+        parser.error("--seed must fit in 32 bits")
+    if not (0 < args.cols <= 0xFFFF and 0 < args.rows <= 0xFFFF and 0 <= args.chunk <= 0xFFFF):
+        parser.error("--cols, --rows and --chunk must fit in 16 bits")
+
+    game.use_planner(args.planner_workers)
+    game.build_world(args.seed, args.cols, args.rows, args.chunk)
+    try:
+        asyncio.run(loopback(args) if args.loopback else serve(args))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        game.use_planner(0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+# tests/test_astar.py
+"""astar_path: the ASTAR_MAX_ITERS cap only bounds chunked worlds."""
+
+import game
+
+def far_pair():
+    """Two open cells far apart: the first and last open cell in row order."""
+    cells = [(x, y) for y in range(game.ROWS) for x in range(game.COLS) if game.maze.adj[y * game.COLS + x]]
+    return cells[0], cells[-1]
+
+def test_flat_world_search_is_not_capped(monkeypatch):
+    game.build_world(7, 60, 45)
+    monkeypatch.setattr(game, "ASTAR_MAX_ITERS", 50)
+    start, goal = far_pair()
+    path = game.astar_path(start, goal)
+    assert len(path) > 50 and path[-1] == goal
+
+def test_chunked_world_search_is_capped(monkeypatch):
+    game.build_world(7, 60, 45, 16)
+    start, goal = far_pair()
+    assert game.astar_path(start, goal)[-1] == goal
+    monkeypatch.setattr(game, "ASTAR_MAX_ITERS", 50)
+    assert game.astar_path(start, goal) == []
@@ -0,0 +1,45 @@
+# tests/test_hpa.py
+"""HierarchicalPlanner: replanning toward goals that share a cluster."""
+
+import random
+import pytest
+import game
+
+def walk(planner, start, goal, limit=2000):
+    """Replan from wherever the last path ended, like a bot does; the cell reached."""
+    cell = start
+    for _ in range(limit):
+        if cell == goal:
+            break
+        path = planner.find_path(cell, goal)
+        if not path:
+            break
+        cell = path[-1]
+    return cell
+
+@pytest.fixture(scope="module")
+def world():
+    game.build_world(5, 120, 90)
+    return game.hpa
+
+def test_goals_in_one_cluster_do_not_share_a_route(world):
+    start, goal = (63, 12), (23, 5)
+    # walking to (25, 2) first leaves routes into goal's cluster warm along the
+    # way; a route that ends where (23, 5) cannot be reached used to make the
+    # walk bounce between (29, 2) and (30, 2) forever
+    assert walk(world, start, (25, 2)) == (25, 2)
+    assert walk(world, start, goal) == goal
+
+def test_alternating_goals_are_reached(world):
+    rng = random.Random(3)
+    open_cells = [(x, y) for y in range(game.ROWS) for x in range(game.COLS)
+                  if game.maze.cells[y * game.COLS + x] == 0]
+    checked = 0
+    while checked < 40:
+        start = rng.choice(open_cells)
+        cx, cy = rng.randrange(game.COLS // game.HPA_CLUSTER), rng.randrange(game.ROWS // game.HPA_CLUSTER)
+        goals = [c for c in open_cells if c[0] // game.HPA_CLUSTER == cx and c[1] // game.HPA_CLUSTER == cy]
+        goals = [g for g in rng.sample(goals, min(3, len(goals))) if game.astar_path(start, g)]
+        for goal in goals + goals[::-1]:
+            assert walk(world, start, goal) == goal
+            checked += 1
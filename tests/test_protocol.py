@@ -0,0 +1,122 @@
+# tests/test_protocol.py
+"""Round-trip and fuzz tests for the binary wire format in protocol.py."""
+
+import random
+import pytest
+import protocol
+from protocol import (Encoder, FrameReader, ProtocolError, decode_fire, decode_input, decode_join,
+                      decode_snapshot, decode_welcome, encode_fire, encode_input, encode_join,
+                      encode_welcome, entity_id, input_dt, message_type)
+
+def random_state(rng, n):
+    state = {}
+    for _ in range(n):
+        eid = entity_id(rng.randrange(4), rng.randrange(protocol.INDEX_MASK + 1))
+        state[eid] = (rng.randrange(protocol.MAX_COORD + 1), rng.randrange(protocol.MAX_COORD + 1),
+                      rng.randrange(4), rng.randrange(256))
+    return state
+
+def mutate(rng, state):
+    new = {}
+    top = protocol.MAX_COORD
+    for eid, (x, y, flags, hp) in state.items():
+        r = rng.random()
+        if r < 0.05:
+            continue                                   # removed
+        if r < 0.6:                                    # small move
+            x = min(top, max(0, x + rng.randint(-130, 130)))
+            y = min(top, max(0, y + rng.randint(-130, 130)))
+        elif r < 0.65:                                 # teleport
+            x, y = rng.randrange(top + 1), rng.randrange(top + 1)
+        if rng.random() < 0.05:
+            flags = rng.randrange(4)
+        if rng.random() < 0.1:
+            hp = rng.randrange(256)
+        new[eid] = (x, y, flags, hp)
+    new.update(random_state(rng, rng.randrange(4)))    # spawned
+    return new
+
+def snapshot_stream(seed, iterations):
+    """Yield (seq, state, body, receiver history) for a random stream with random, sometimes stale, acks."""
+    rng = random.Random(seed)
+    enc = Encoder()
+    sent = {}           # sender history: seq -> state
+    received = {}       # receiver history
+    state = random_state(rng, 50)
+    for seq in range(1, iterations + 1):
+        state = mutate(rng, state)
+        acked = [s for s in received if s > seq - 32]
+        base_seq = rng.choice(acked) if acked and rng.random() < 0.9 else 0
+        data = bytes(enc.snapshot(seq, seq / 20, state, base_seq, sent.get(base_seq), seq * 3, (seq + 0.5, 2.0)))
+        reader = FrameReader()
+        cut = rng.randrange(len(data) + 1)             # arbitrary TCP segmentation
+        reader.feed(data[:cut]); reader.feed(data[cut:])
+        (body,) = list(reader.frames())
+        yield seq, state, body, received
+        sent[seq] = state
+        for old in [s for s in sent if s <= seq - 32]:
+            del sent[old]; received.pop(old, None)
+
+def test_snapshot_round_trip():
+    for seq, state, body, received in snapshot_stream(0, 2000):
+        assert message_type(body) == protocol.MSG_SNAPSHOT
+        got_seq, t, got, own = decode_snapshot(body, received)
+        assert (got_seq, t) == (seq, seq / 20)
+        assert got == state
+        assert own == (seq * 3, seq + 0.5, 2.0)
+        received[seq] = got
+
+@pytest.mark.parametrize("seed", range(4))
+def test_corrupt_snapshots_raise_protocol_error(seed):
+    rng = random.Random(seed)
+    for seq, state, body, received in snapshot_stream(seed, 500):
+        received[seq] = decode_snapshot(body, received)[2]
+        bad = bytearray(body)
+        if rng.random() < 0.5:
+            bad = bad[:rng.randrange(len(bad))]
+        else:
+            for _ in range(rng.randint(1, 4)):
+                bad[rng.randrange(len(bad))] = rng.randrange(256)
+        try:
+            message_type(bad)
+            decode_snapshot(bad, received)
+        except ProtocolError:
+            pass
+
+def test_unknown_base_is_rejected():
+    body = bytes(Encoder().snapshot(2, 0.0, {1: (1, 2, 1, 3)}, 1, {1: (0, 0, 1, 3)}))[2:]
+    with pytest.raises(ProtocolError):
+        decode_snapshot(body, {})
+
+def test_input_round_trip():
+    rng = random.Random(1)
+    for seq in range(1, 500):
+        inputs = [(seq + i, rng.randint(-1, 1), rng.randint(-1, 1), input_dt(rng.uniform(0, 0.3)))
+                  for i in range(rng.randrange(protocol.MAX_INPUTS + 1))]
+        body = encode_input(seq, inputs)[2:]
+        assert message_type(body) == protocol.MSG_INPUT
+        assert decode_input(body) == (seq, inputs)
+        try:
+            decode_input(body[:rng.randrange(len(body))])
+        except ProtocolError:
+            pass
+
+def test_small_messages_round_trip():
+    assert decode_join(encode_join("pilot-é", 10.5, 20.25)[2:]) == ("pilot-é", 10.5, 20.25)
+    assert decode_fire(encode_fire(5.5, 6.75)[2:]) == (5.5, 6.75)
+    assert decode_welcome(encode_welcome(entity_id(protocol.KIND_PLAYER, 3), (7, 120, 90, 0))[2:]) == (3, (7, 120, 90, 0))
+
+def test_wrong_version_is_rejected():
+    body = bytearray(encode_fire(1, 2)[2:])
+    body[0] = protocol.VERSION + 1
+    with pytest.raises(ProtocolError):
+        message_type(body)
+
+def test_positions_cover_large_worlds():
+    # a 1000 x 1000 cell world is 40000 px across
+    x, y = 39999.75, 31234.5
+    state = {entity_id(protocol.KIND_BOT, 7): protocol.entity_state(x, y, hp=50)}
+    body = bytes(Encoder().snapshot(1, 0.0, state))[2:]
+    (xq, yq, _, _), = decode_snapshot(body, {})[2].values()
+    assert (protocol.dequantize(xq), protocol.dequantize(yq)) == (x, y)
+    assert decode_fire(encode_fire(x, y)[2:]) == (x, y)
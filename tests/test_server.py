@@ -0,0 +1,78 @@
+# tests/test_server.py
+"""ServerMatch and GameServer: input budgeting and snapshot sending."""
+
+import pytest
+import game
+import protocol
+import server
+
+@pytest.fixture
+def joined():
+    """A match with one guest whose moves are recorded instead of applied."""
+    game.build_world(3, 40, 30)
+    sm = server.ServerMatch("m", 60, 0)
+    sm.join(server.ClientConn(None, None), 0, 0)    # host, never sends input
+    conn = server.ClientConn(None, None)
+    conn.id, conn.match = "guest", sm
+    sm.join(conn, 100, 100)
+    applied = []
+    sm.player_of(conn).move = lambda dx, dy, dt: applied.append(dt)
+    return sm, conn, applied
+
+def send(sm, conn, inputs):
+    sm.on_message(conn, protocol.MSG_INPUT, protocol.encode_input(0, inputs)[protocol.FRAME.size:])
+
+def test_overlong_input_is_acked_but_not_applied(joined):
+    sm, conn, applied = joined
+    send(sm, conn, [(1, 1, 0, 6.5)])
+    for _ in range(10):
+        sm.apply_inputs()
+    assert applied == []
+    assert conn.input_ack == 1
+    assert conn.rejected_inputs == 1
+
+def test_input_time_cannot_outrun_server_time(joined):
+    sm, conn, applied = joined
+    dt = protocol.input_dt(1 / 60)
+    for start in range(1, 241, 60):
+        send(sm, conn, [(s, 1, 0, dt) for s in range(start, start + 60)])
+    ticks = 30
+    for _ in range(ticks):
+        sm.apply_inputs()
+    assert 0 < sum(applied) <= ticks * sm.dt * server.INPUT_TIME_SLACK
+    # the rest is queued, not lost: it is applied as server time catches up
+    assert conn.input_ack == len(applied)
+    for _ in range(400):
+        sm.apply_inputs()
+    assert conn.input_ack == server.MAX_PENDING_INPUTS
+    assert conn.rejected_inputs == 240 - server.MAX_PENDING_INPUTS
+
+def test_honest_client_is_never_held_back(joined):
+    sm, conn, applied = joined
+    dt = protocol.input_dt(sm.dt)
+    for seq in range(1, 3601):
+        send(sm, conn, [(seq, 0, 1, dt)])
+        sm.apply_inputs()
+        assert conn.input_ack == seq
+    assert conn.rejected_inputs == 0
+
+class Sink:
+    def __init__(self):
+        self.frames = []
+
+    def write(self, data):
+        self.frames.append(data)
+
+def test_oversized_snapshot_is_skipped_not_raised():
+    game.build_world(3, 40, 30)
+    gs = server.GameServer(bot_count=0)
+    sm = gs.add_match()
+    conn = server.ClientConn(None, Sink())
+    conn.id, conn.match = "c", sm
+    sm.join(conn, 100, 100)
+    huge = {protocol.entity_id(protocol.KIND_BULLET, i): (i, i, 0, 0) for i in range(20000)}
+    gs.send_state(conn, sm, huge)
+    assert gs.snapshots_dropped == 1
+    assert conn.writer.frames == [] and conn.seq == 0
+    gs.send_state(conn, sm, {protocol.entity_id(protocol.KIND_PLAYER, 0): (1, 1, 0, 100)})
+    assert len(conn.writer.frames) == 1 and conn.seq == 1